@@ -1,15 +1,17 @@
-from fastapi import Depends
+from fastapi import Depends, Request, Response
 from fastapi.routing import APIRouter
 from sqlalchemy.ext.asyncio import AsyncSession
-from config.db import get_db
-from models.users import User
-from schemas.cart import CartChange, CartChangeQuantity, CartProductCreate, CartRead
+from config.db import get_db, writes_data
+from schemas.cart import CartBatch, CartBatchRead, CartChange, CartChangeQuantity, CartProductCreate, CartRead
+from schemas.users import Principal
 from services.cart import (
     add_cart_product,
     add_quantity_cart_product,
+    apply_cart_batch,
     delete_all_cart_products,
     delete_cart_product,
     get_cart,
+    get_cart_version,
     sub_quantity_cart_product,
 )
 from services.users import get_current_active_user
@@ -20,6 +22,7 @@ cart_router = APIRouter(prefix="/cart", tags=["Cart"])
 @cart_router.post(
     "",
     summary="Добавить товар в корзину",
+    dependencies=[Depends(writes_data)],
     responses={
         401: {"description": "Unauthorized"},
         423: {"description": "Товар неактивен"},
@@ -29,7 +32,7 @@ cart_router = APIRouter(prefix="/cart", tags=["Cart"])
 )
 async def add_product_to_cart(
     cart_product: CartProductCreate,
-    user: User = Depends(get_current_active_user),
+    user: Principal = Depends(get_current_active_user),
     db: AsyncSession = Depends(get_db),
 ) -> CartRead:
     """
@@ -44,9 +47,43 @@ async def add_product_to_cart(
     return await add_cart_product(cart_product, user, db)
 
 
+@cart_router.post(
+    "/batch",
+    summary="Изменить несколько товаров в корзине",
+    dependencies=[Depends(writes_data)],
+    responses={
+        401: {"description": "Unauthorized"},
+    },
+)
+async def change_products_in_cart(
+    items: CartBatch,
+    user: Principal = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_db),
+) -> CartBatchRead:
+    """
+    Применяет список операций с корзиной в одной транзакции (не более 500 операций).
+
+    Поля операции:
+    - ***product_id**: Уникальный идентификатор продукта
+    - **quantity**: Количество (необязательно, по умолчанию - 1)
+    - **action**: add - добавить количество, set - установить количество,
+    remove - удалить товар из корзины (необязательно, по умолчанию - add)
+
+    Операции с одним товаром применяются в порядке следования.
+    Несуществующие и неактивные товары не прерывают пакет, а попадают в список ошибок.
+
+    Возвращает список товаров, стоимость и ошибки.
+    - **total_cost**: Сумма стоимости товаров в корзине
+    - **cart**: Список товаров
+    - **errors**: Товары, которые не удалось добавить (product_id, status_code, detail)
+    """
+    return await apply_cart_batch(items, user, db)
+
+
 @cart_router.patch(
     "/add/{product_id}",
     summary="Добавить единицу товара в корзине.",
+    dependencies=[Depends(writes_data)],
     responses={
         401: {"description": "Unauthorized"},
         404: {"description": "Товар в корзине не найден"},
@@ -54,7 +91,7 @@ async def add_product_to_cart(
 )
 async def add_quantity_product_in_cart(
     product_id: int,
-    user: User = Depends(get_current_active_user),
+    user: Principal = Depends(get_current_active_user),
     db: AsyncSession = Depends(get_db),
 ) -> CartChangeQuantity:
     """
@@ -68,6 +105,7 @@ async def add_quantity_product_in_cart(
 @cart_router.patch(
     "/sub/{product_id}",
     summary="Отнять единицу товара в корзине.",
+    dependencies=[Depends(writes_data)],
     responses={
         401: {"description": "Unauthorized"},
         404: {"description": "Товар в корзине не найден"},
@@ -75,7 +113,7 @@ async def add_quantity_product_in_cart(
 )
 async def sub_quantity_product_in_cart(
     product_id: int,
-    user: User = Depends(get_current_active_user),
+    user: Principal = Depends(get_current_active_user),
     db: AsyncSession = Depends(get_db),
 ) -> CartChangeQuantity | CartChange:
     """
@@ -93,6 +131,7 @@ async def sub_quantity_product_in_cart(
 @cart_router.delete(
     "/{product_id}",
     summary="Удалить товар из корзины по его id",
+    dependencies=[Depends(writes_data)],
     responses={
         401: {"description": "Unauthorized"},
         404: {"description": "Товар в корзине не найден"},
@@ -100,7 +139,7 @@ async def sub_quantity_product_in_cart(
 )
 async def delete_product_from_cart(
     product_id: int,
-    user: User = Depends(get_current_active_user),
+    user: Principal = Depends(get_current_active_user),
     db: AsyncSession = Depends(get_db),
 ) -> CartChange:
     """
@@ -115,12 +154,13 @@ async def delete_product_from_cart(
 @cart_router.delete(
     "",
     summary="Очистить корзину",
+    dependencies=[Depends(writes_data)],
     responses={
         401: {"description": "Unauthorized"},
     },
 )
 async def clear_cart(
-    user: User = Depends(get_current_active_user),
+    user: Principal = Depends(get_current_active_user),
     db: AsyncSession = Depends(get_db),
 ) -> CartChange:
     return await delete_all_cart_products(user, db)
@@ -130,16 +170,29 @@ async def clear_cart(
     "",
     summary="Список товаров в корзине",
     responses={
+        304: {"description": "Корзина не изменилась"},
         401: {"description": "Unauthorized"},
     },
 )
 async def list_product(
-    user: User = Depends(get_current_active_user),
+    request: Request,
+    response: Response,
+    user: Principal = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_db),
 ) -> CartRead:
     """
     Возвращает список товаров в корзине.
 
     - **total_cost**: Сумма стоимости всех товаров в корзине
     - **cart**: Список товаров
+
+    Версия корзины возвращается в заголовке **ETag**. Если передать ее в заголовке
+    **If-None-Match** и корзина с тех пор не менялась, вернется ответ 304 без тела.
     """
-    return await get_cart(user)
+    etag = await get_cart_version(user, db)
+    if_none_match = request.headers.get("If-None-Match", "")
+    if if_none_match.strip() == "*" or etag in [tag.strip() for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers={"ETag": etag})
+
+    response.headers["ETag"] = etag
+    return await get_cart(user, db)
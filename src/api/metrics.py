@@ -0,0 +1,28 @@
+import os
+from fastapi import Depends
+from fastapi.routing import APIRouter
+from services.metrics import collect_metrics
+from services.users import is_admin
+
+metrics_router = APIRouter(prefix="/metrics", tags=["Metrics"])
+
+
+@metrics_router.get(
+    "",
+    summary="Метрики процесса",
+    dependencies=[Depends(is_admin)],
+    responses={
+        401: {"description": "Unauthorized"},
+        403: {"description": "Forbidden"},
+    },
+)
+async def read_metrics() -> dict:
+    """
+    Возвращает метрики обработавшего запрос процесса (воркера).
+
+    Только для администратора.
+
+    - **pid**: Идентификатор процесса
+    - Остальные поля - разделы метрик (пул хеширования паролей и т.д.)
+    """
+    return {"pid": os.getpid(), **collect_metrics()}
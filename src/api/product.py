@@ -1,10 +1,38 @@
-from typing import List
-from fastapi import Depends
+from typing import Annotated, List, Literal, Optional
+from fastapi import BackgroundTasks, Depends, Query, Request, Response
+from fastapi.responses import StreamingResponse
 from fastapi.routing import APIRouter
-from config.db import get_db
-from models.users import User
-from schemas.product import ProductBase, ProductRead, ProductPatch
-from services.product import product_create, product_delete, product_list, product_read, product_update
+from config.db import get_db, get_read_db, get_session_maker, writes_data
+from schemas.product import (
+    ProductBase,
+    ProductBatchItem,
+    ProductBulkPatch,
+    ProductBulkResult,
+    ProductChanges,
+    ProductDeletionRead,
+    ProductIds,
+    ProductImportResult,
+    ProductListQuery,
+    ProductRead,
+    ProductPatch,
+    ProductSuggest,
+)
+from schemas.users import Principal
+from services.product import (
+    get_product_deletion,
+    product_bulk_update,
+    product_changes,
+    product_create,
+    product_delete,
+    product_export,
+    product_list_page,
+    product_read,
+    product_read_many,
+    product_search,
+    product_suggest,
+    product_update,
+)
+from services.product_import import import_products
 from services.users import get_current_active_user, is_admin
 
 product_router = APIRouter(prefix="/product", tags=["Product"])
@@ -13,7 +41,7 @@ product_router = APIRouter(prefix="/product", tags=["Product"])
 @product_router.post(
     "",
     summary="Новый товар",
-    dependencies=[Depends(is_admin)],
+    dependencies=[Depends(is_admin), Depends(writes_data)],
     responses={
         401: {"description": "Unauthorized"},
         403: {"description": "Forbidden"},
@@ -37,10 +65,74 @@ async def create_product(
     return await product_create(product, db)
 
 
+@product_router.post(
+    "/import",
+    summary="Импорт товаров",
+    dependencies=[Depends(is_admin), Depends(writes_data)],
+    responses={
+        401: {"description": "Unauthorized"},
+        403: {"description": "Forbidden"},
+    },
+)
+async def import_product(
+    request: Request,
+    background_tasks: BackgroundTasks,
+    format: Optional[Literal["csv", "ndjson"]] = None,
+    db=Depends(get_db),
+    session_maker=Depends(get_session_maker),
+) -> ProductImportResult:
+    """
+    Загружает товары из тела запроса в формате CSV (с заголовком) или NDJSON (объект JSON в строке).
+
+    Только для администратора.
+
+    Поля строки: **id** (необязательно), ***name**, ***price**, **is_active**.
+    Товар с существующим id обновляется, товар без id создается.
+
+    - **format**: csv или ndjson (по умолчанию определяется по Content-Type: text/csv - csv, иначе - ndjson)
+
+    Некорректные строки пропускаются. Возвращает количество загруженных и отклоненных строк
+    и первые 100 ошибок с номерами строк.
+    """
+    if format is None:
+        format = "csv" if request.headers.get("content-type", "").startswith("text/csv") else "ndjson"
+
+    return await import_products(request.stream(), format, db, background_tasks, session_maker)
+
+
+@product_router.patch(
+    "/bulk",
+    summary="Редактировать несколько товаров",
+    dependencies=[Depends(is_admin), Depends(writes_data)],
+    responses={
+        401: {"description": "Unauthorized"},
+        403: {"description": "Forbidden"},
+    },
+)
+async def bulk_update_product(
+    data: ProductBulkPatch,
+    background_tasks: BackgroundTasks,
+    db=Depends(get_db),
+    session_maker=Depends(get_session_maker),
+) -> ProductBulkResult:
+    """
+    Обновляет несколько товаров (не более 10000) одним запросом.
+
+    Только для администратора.
+
+    Укажите либо:
+    - **ids** и **patch**: Список id товаров и изменения для них (поля как в Редактировать товар)
+    - **items**: Список изменений, у каждого свой **id** и изменяемые поля
+
+    Возвращает id обновленных (**updated**) и ненайденных (**not_found**) товаров.
+    """
+    return await product_bulk_update(data, db, background_tasks, session_maker)
+
+
 @product_router.patch(
     "/{product_id}",
     summary="Редактировать товар",
-    dependencies=[Depends(is_admin)],
+    dependencies=[Depends(is_admin), Depends(writes_data)],
     responses={
         401: {"description": "Unauthorized"},
         403: {"description": "Forbidden"},
@@ -50,7 +142,9 @@ async def create_product(
 async def update_product(
     product_id: int,
     product: ProductPatch,
+    background_tasks: BackgroundTasks,
     db=Depends(get_db),
+    session_maker=Depends(get_session_maker),
 ) -> ProductPatch:
     """
     Вносит изменения в товар, определяя его по id.
@@ -64,7 +158,118 @@ async def update_product(
     - **price**: Цена
     - **is_active**: Активен/Неактивен
     """
-    return await product_update(product_id, product, db)
+    return await product_update(product_id, product, db, background_tasks, session_maker)
+
+
+@product_router.get(
+    "/search",
+    summary="Поиск товаров",
+    responses={
+        400: {"description": "Некорректный курсор"},
+        401: {"description": "Unauthorized"},
+    },
+)
+async def search_product(
+    response: Response,
+    q: str = Query(..., min_length=1, max_length=100),
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = None,
+    user: Principal = Depends(get_current_active_user),
+    db=Depends(get_read_db),
+) -> List[ProductRead]:
+    """
+    Возвращает товары, наименование которых соответствует запросу, начиная с наиболее релевантных.
+
+    Неактивные товары возвращаются только администратору.
+
+    - **q**: Поисковый запрос
+    - **limit**: Количество товаров на странице (по умолчанию - 50, максимум - 500)
+    - **cursor**: Курсор следующей страницы из заголовка X-Next-Cursor предыдущего ответа
+    """
+    items, next_cursor = await product_search(user, db, q, limit, cursor)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return items
+
+
+@product_router.get(
+    "/suggest",
+    summary="Подсказки по наименованию",
+    responses={401: {"description": "Unauthorized"}},
+)
+async def suggest_product(
+    prefix: str = Query(..., min_length=1, max_length=100),
+    limit: int = Query(10, ge=1, le=50),
+    user: Principal = Depends(get_current_active_user),
+    db=Depends(get_read_db),
+) -> List[ProductSuggest]:
+    """
+    Возвращает активные товары, наименование которых начинается с prefix (без учета регистра),
+    в алфавитном порядке.
+
+    - **prefix**: Начало наименования
+    - **limit**: Количество подсказок (по умолчанию - 10, максимум - 50)
+    """
+    return await product_suggest(db, prefix, limit)
+
+
+@product_router.get(
+    "/export",
+    summary="Выгрузка товаров",
+    dependencies=[Depends(is_admin)],
+    response_class=StreamingResponse,
+    responses={
+        200: {"content": {"application/x-ndjson": {}}},
+        401: {"description": "Unauthorized"},
+        403: {"description": "Forbidden"},
+    },
+)
+async def export_product(request: Request, session_maker=Depends(get_session_maker)):
+    """
+    Выгружает все товары (включая неактивные) в формате NDJSON: по одному товару JSON
+    (см. Информация о товаре) в строке, по возрастанию id.
+
+    Только для администратора.
+
+    Если клиент принимает gzip (Accept-Encoding), выгрузка сжимается.
+    """
+    compress = "gzip" in request.headers.get("Accept-Encoding", "")
+    headers = {"Vary": "Accept-Encoding"}
+    if compress:
+        headers["Content-Encoding"] = "gzip"
+    content = product_export(session_maker, compress)
+    return StreamingResponse(content, media_type="application/x-ndjson", headers=headers)
+
+
+@product_router.get(
+    "/changes",
+    summary="Лента изменений товаров",
+    dependencies=[Depends(is_admin)],
+    responses={
+        400: {"description": "Некорректный курсор"},
+        401: {"description": "Unauthorized"},
+        403: {"description": "Forbidden"},
+    },
+)
+async def changes_product(
+    since: Optional[str] = None,
+    limit: int = Query(500, ge=1, le=5000),
+    db=Depends(get_read_db),
+) -> ProductChanges:
+    """
+    Возвращает созданные, измененные и удаленные товары в порядке изменения.
+
+    Только для администратора.
+
+    - **since**: Курсор из поля cursor предыдущего ответа (без него лента начинается с начала)
+    - **limit**: Количество изменений в ответе (по умолчанию - 500, максимум - 5000)
+
+    Для каждого изменения возвращается id товара, признак удаления **deleted**, время изменения
+    **changed_at** и товар (см. Информация о товаре), если он не удален.
+    Если **has_more**, следующие изменения можно получить сразу, иначе - повторить запрос позже
+    с тем же курсором.
+    """
+    return await product_changes(db, since, limit)
 
 
 @product_router.get(
@@ -78,8 +283,8 @@ async def update_product(
 )
 async def retrieve_product(
     product_id: int,
-    user: User = Depends(get_current_active_user),
-    db=Depends(get_db),
+    user: Principal = Depends(get_current_active_user),
+    db=Depends(get_read_db),
 ) -> ProductRead:
     """
     Возвращает товар из БД по его id
@@ -93,27 +298,76 @@ async def retrieve_product(
     return await product_read(user, product_id, db)
 
 
+@product_router.post(
+    "/batch",
+    summary="Информация о нескольких товарах",
+    responses={
+        401: {"description": "Unauthorized"},
+    },
+)
+async def retrieve_products(
+    product_ids: ProductIds,
+    user: Principal = Depends(get_current_active_user),
+    db=Depends(get_read_db),
+) -> List[ProductBatchItem]:
+    """
+    Возвращает товары по списку id (не более 500) в порядке списка.
+
+    Для каждого id возвращается:
+    - **id**: Уникальный идентификатор
+    - **status_code**: 200, 404 (товар не найден) или 423 (товар неактивен)
+    - **detail**: Описание ошибки
+    - **product**: Товар (см. Информация о товаре), если он доступен
+    """
+    return await product_read_many(user, product_ids, db)
+
+
 @product_router.get(
     "",
     summary="Список товаров",
-    responses={401: {"description": "Unauthorized"}},
+    responses={
+        400: {"description": "Некорректный курсор"},
+        401: {"description": "Unauthorized"},
+    },
 )
 async def list_product(
-    user: User = Depends(get_current_active_user),
-    db=Depends(get_db),
+    request: Request,
+    params: Annotated[ProductListQuery, Query()],
+    user: Principal = Depends(get_current_active_user),
+    db=Depends(get_read_db),
 ) -> List[ProductRead]:
     """
     Возвращает список активных товаров.
 
     Если пользователь админ, возвращает все товары (см. Информация о товаре)
+
+    Сортировка и фильтры (необязательно):
+    - **sort**: newest - сначала новые (по умолчанию), name - по наименованию, price - по возрастанию цены
+    - **min_price**, **max_price**: Диапазон цены
+    - **updated_since**: Товары, измененные начиная с этого момента
+
+    Параметры постраничного вывода:
+    - **limit**: Количество товаров на странице (по умолчанию - 50, максимум - 500)
+    - **after_id**: Вернуть товары, следующие за товаром с этим id (только для sort=newest)
+    - **cursor**: Курсор следующей страницы из заголовка X-Next-Cursor предыдущего ответа
+
+    Если есть следующая страница, ее курсор возвращается в заголовке **X-Next-Cursor**.
     """
-    return await product_list(user, db)
+    page = await product_list_page(user, db, params)
+
+    headers = {"Vary": "Accept-Encoding"}
+    if page.next_cursor:
+        headers["X-Next-Cursor"] = page.next_cursor
+    if page.gzip_body is not None and "gzip" in request.headers.get("Accept-Encoding", ""):
+        headers["Content-Encoding"] = "gzip"
+        return Response(content=page.gzip_body, media_type="application/json", headers=headers)
+    return Response(content=page.body, media_type="application/json", headers=headers)
 
 
 @product_router.delete(
     "/{product_id}",
     summary="Удалить товар",
-    dependencies=[Depends(is_admin)],
+    dependencies=[Depends(is_admin), Depends(writes_data)],
     response_description="Товар удален",
     responses={
         200: {"description": "Успешное удаление"},
@@ -124,11 +378,40 @@ async def list_product(
 )
 async def delete_product(
     product_id: int,
+    background_tasks: BackgroundTasks,
     db=Depends(get_db),
+    session_maker=Depends(get_session_maker),
 ):
     """
     Удаляет товар из БД по его id.
 
     Только для администратора.
+
+    Товар сразу становится неактивным, удаление из корзин и из БД продолжается в фоне
+    (см. Ход удаления товара).
+    """
+    return await product_delete(product_id, db, background_tasks, session_maker)
+
+
+@product_router.get(
+    "/{product_id}/deletion",
+    summary="Ход удаления товара",
+    dependencies=[Depends(is_admin)],
+    responses={
+        401: {"description": "Unauthorized"},
+        403: {"description": "Forbidden"},
+        404: {"description": "Удаление товара не найдено"},
+    },
+)
+async def retrieve_product_deletion(product_id: int, db=Depends(get_read_db)) -> ProductDeletionRead:
+    """
+    Возвращает ход фонового удаления товара.
+
+    Только для администратора.
+
+    - **status**: running - выполняется, done - завершено, failed - прервано ошибкой (повторите удаление)
+    - **deleted_cart_items**: Сколько позиций корзин удалено
+    - **started_at**, **finished_at**: Время начала и завершения
     """
-    return await product_delete(product_id, db)
+    deletion = await get_product_deletion(product_id, db)
+    return ProductDeletionRead.model_validate(deletion, from_attributes=True)
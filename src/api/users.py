@@ -1,7 +1,7 @@
 from fastapi import Depends
 from fastapi.routing import APIRouter
 from sqlalchemy.ext.asyncio import AsyncSession
-from config.db import get_db
+from config.db import get_db, get_read_db, writes_data
 from schemas.users import CreateUser, LoginSchema, UserRead, Token
 from services.users import create_user, get_access_token
 
@@ -11,6 +11,7 @@ users_router = APIRouter(prefix="/users", tags=["User"])
 @users_router.post(
     "/register",
     summary="Регистрация",
+    dependencies=[Depends(writes_data)],
     response_description="Пользователь создан",
     response_model=UserRead,
     status_code=201,
@@ -36,7 +37,7 @@ async def registration(user: CreateUser, db: AsyncSession = Depends(get_db)):
     summary="Получить токен",
     tags=["User"],
 )
-async def login_for_access_token(data: LoginSchema, db: AsyncSession = Depends(get_db)) -> Token:
+async def login_for_access_token(data: LoginSchema, db: AsyncSession = Depends(get_read_db)) -> Token:
     """
     Поля, к заполнению:
     - **username**: email или телефон в формате +70000000000
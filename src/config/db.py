@@ -1,10 +1,81 @@
+import math
 import re
-from sqlalchemy.ext.asyncio import AsyncAttrs, async_sessionmaker, create_async_engine
+import time
+import jwt
+from fastapi import Depends, Request, Response
+from fastapi.security.utils import get_authorization_scheme_param
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy import BigInteger, exc
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.ext.asyncio import AsyncAttrs, AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import DeclarativeBase, declared_attr
+from sqlalchemy.sql.functions import FunctionElement
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 
 from config.settings import settings
+from services.cache import MISSING, LRUCache
+from services.metrics import register_metrics
 
-engine = create_async_engine(settings.db.url)
+
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    """
+    Пул соединений, считающий выдачи соединений, время ожидания свободного соединения и таймауты.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            self.timeouts += 1
+            raise
+        finally:
+            waited = time.perf_counter() - started
+            self.wait_seconds += waited
+            self.max_wait_seconds = max(self.max_wait_seconds, waited)
+        self.checkouts += 1
+        return connection
+
+    def stats(self) -> dict:
+        return {
+            "pool_size": self.size(),
+            "max_overflow": self._max_overflow,
+            "checked_out": self.checkedout(),
+            "checked_in": self.checkedin(),
+            "overflow": max(self.overflow(), 0),
+            "checkouts": self.checkouts,
+            "timeouts": self.timeouts,
+            "wait_seconds": round(self.wait_seconds, 6),
+            "max_wait_seconds": round(self.max_wait_seconds, 6),
+        }
+
+
+def create_engine(url: str):
+    return create_async_engine(
+        url,
+        poolclass=InstrumentedPool,
+        pool_size=settings.db.pool_size,
+        max_overflow=settings.db.max_overflow,
+        pool_timeout=settings.db.pool_timeout,
+        pool_recycle=settings.db.pool_recycle,
+        pool_pre_ping=settings.db.pool_pre_ping,
+        connect_args={
+            "statement_cache_size": settings.db.statement_cache_size,
+            "prepared_statement_cache_size": settings.db.prepared_statement_cache_size,
+        },
+    )
+
+
+engine = create_engine(settings.db.url)
+# Пул пересоздается при engine.dispose(), поэтому берется при каждом сборе метрик
+register_metrics("db_pool", lambda: engine.pool.stats())
 
 async_session_maker = async_sessionmaker(
     bind=engine,
@@ -12,6 +83,25 @@ async_session_maker = async_sessionmaker(
     autoflush=False,
 )
 
+# Реплика для чтения, если настроена
+replica_engine = None
+replica_session_maker = None
+if settings.db.replica_url:
+    replica_engine = create_engine(settings.db.replica_url)
+    register_metrics("db_replica_pool", lambda: replica_engine.pool.stats())
+    replica_session_maker = async_sessionmaker(
+        bind=replica_engine,
+        expire_on_commit=False,
+        autoflush=False,
+    )
+
+# Cookie и клиенты (по заголовку Authorization), недавно изменявшие данные:
+# до указанного времени (time.time()) они читают из основной БД
+PRIMARY_COOKIE = "read_primary_until"
+# Клиенты (id пользователей), недавно изменявшие данные через этот воркер
+MAX_PINNED_CLIENTS = 10000
+pinned_clients = LRUCache(MAX_PINNED_CLIENTS, settings.db.read_your_writes_seconds)
+
 
 class Base(AsyncAttrs, DeclarativeBase):
     """Базовый класс для всех моделей"""
@@ -27,6 +117,178 @@ class Base(AsyncAttrs, DeclarativeBase):
         return table_name.lower()
 
 
-async def get_db():
-    async with async_session_maker() as db:
-        yield db
+def token_user_id(request: Request) -> int | None:
+    """
+    Возвращает id пользователя из токена запроса без проверки подписи.
+    Используется только для выбора БД: поддельный id лишь направит чтения в основную БД.
+    """
+    scheme, token = get_authorization_scheme_param(request.headers.get("Authorization"))
+    if scheme.lower() != "bearer" or not token:
+        return None
+    try:
+        user_id = jwt.decode(token, options={"verify_signature": False}).get("uid")
+    except jwt.InvalidTokenError:
+        return None
+    return user_id if isinstance(user_id, int) else None
+
+
+def writes_data(request: Request):
+    """
+    Зависимость обработчиков, изменяющих данные: после успешного ответа клиент
+    некоторое время читает из основной БД (см. pin_to_primary).
+    """
+    request.state.writes_data = True
+
+
+def pin_to_primary(request: Request, response: Response):
+    """
+    Направляет следующие чтения клиента в основную БД на settings.db.read_your_writes_seconds,
+    чтобы он увидел свои изменения, даже если реплика отстает.
+    Клиент запоминается в воркере по id пользователя, а cookie действует и в других воркерах.
+    """
+    if replica_session_maker is None:
+        return
+
+    user_id = token_user_id(request)
+    if user_id is not None:
+        pinned_clients.set(user_id, True)
+    response.set_cookie(
+        PRIMARY_COOKIE,
+        str(time.time() + settings.db.read_your_writes_seconds),
+        max_age=math.ceil(settings.db.read_your_writes_seconds),
+        httponly=True,
+        samesite="lax",
+    )
+
+
+def is_pinned_to_primary(request: Request) -> bool:
+    user_id = token_user_id(request)
+    if user_id is not None and pinned_clients.get(user_id) is not MISSING:
+        return True
+    try:
+        return float(request.cookies.get(PRIMARY_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+class RequestSessions:
+    """
+    Сессии запроса к основной БД и к реплике. Каждая создается при первом обращении
+    и общая для всех зависимостей запроса (авторизации и обработчика).
+    Соединение из пула сессия берет только при первом запросе к БД.
+    """
+
+    def __init__(
+        self,
+        request: Request,
+        session_maker: async_sessionmaker,
+        read_session_maker: async_sessionmaker | None = None,
+    ):
+        self.request = request
+        self.session_maker = session_maker
+        self.read_session_maker = read_session_maker
+        self.primary: AsyncSession | None = None
+        self.replica: AsyncSession | None = None
+
+    def get_primary(self) -> AsyncSession:
+        if self.primary is None:
+            self.primary = self.session_maker()
+        return self.primary
+
+    def get_read(self) -> AsyncSession:
+        """
+        Сессия для чтения: к реплике, если она настроена, клиент недавно не изменял данные
+        и в запросе еще не используется основная БД. Иначе - к основной БД.
+        """
+        if self.read_session_maker is None or self.primary is not None or is_pinned_to_primary(self.request):
+            return self.get_primary()
+        if self.replica is None:
+            self.replica = self.read_session_maker()
+        return self.replica
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        for db in (self.replica, self.primary):
+            if db is not None:
+                await db.close()
+
+
+async def get_sessions(request: Request):
+    async with RequestSessions(request, async_session_maker, replica_session_maker) as sessions:
+        yield sessions
+
+
+async def get_db(sessions: RequestSessions = Depends(get_sessions)) -> AsyncSession:
+    return sessions.get_primary()
+
+
+async def get_read_db(sessions: RequestSessions = Depends(get_sessions)) -> AsyncSession:
+    """
+    Сессия для запросов, которые только читают данные (см. RequestSessions.get_read).
+    """
+    return sessions.get_read()
+
+
+def is_replica(db: AsyncSession) -> bool:
+    return replica_engine is not None and db.bind is replica_engine
+
+
+def get_session_maker() -> async_sessionmaker:
+    """
+    Возвращает фабрику сессий для обработчиков, которым сессия нужна после
+    завершения зависимостей (например, при потоковой отдаче ответа).
+    """
+    return async_session_maker
+
+
+def get_insert(db: AsyncSession):
+    """
+    Возвращает конструктор INSERT диалекта сессии (с поддержкой ON CONFLICT).
+    """
+    if db.bind.dialect.name == "sqlite":
+        return sqlite.insert
+    return postgresql.insert
+
+
+class current_change_seq(FunctionElement):
+    """
+    Номер изменения строки для лент изменений: id транзакции в Postgres, время записи
+    в микросекундах в остальных диалектах (SQLite выполняет пишущие транзакции по одной).
+    """
+
+    type = BigInteger()
+    inherit_cache = True
+
+
+class change_watermark(FunctionElement):
+    """
+    Граница для лент изменений: все строки с меньшим номером изменения зафиксированы, а строки,
+    которые будут зафиксированы позже, получат номер не меньше границы. В Postgres это
+    xmin текущего снимка (самая старая незавершенная транзакция).
+    """
+
+    type = BigInteger()
+    inherit_cache = True
+
+
+@compiles(current_change_seq, "postgresql")
+def compile_change_seq_postgresql(element, compiler, **kw):
+    return "pg_current_xact_id()::text::bigint"
+
+
+@compiles(current_change_seq)
+def compile_change_seq(element, compiler, **kw):
+    return "CAST((julianday('now') - 2440587.5) * 86400000000 AS INTEGER)"
+
+
+@compiles(change_watermark, "postgresql")
+def compile_change_watermark_postgresql(element, compiler, **kw):
+    return "pg_snapshot_xmin(pg_current_snapshot())::text::bigint"
+
+
+@compiles(change_watermark)
+def compile_change_watermark(element, compiler, **kw):
+    # Незафиксированных чужих изменений в SQLite не бывает
+    return "9223372036854775807"
@@ -1,3 +1,4 @@
+from typing import Literal, Optional
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -7,6 +8,25 @@ class DatabaseSettings(BaseSettings):
     postgres_user: str
     postgres_password: str
     postgres_db: str
+    # Реплика для чтения (необязательно): хост и порт, пользователь и БД те же
+    postgres_replica_host: Optional[str] = None
+    postgres_replica_port: Optional[int] = None
+    # Сколько секунд после изменения данных клиент читает из основной БД, а не из реплики
+    read_your_writes_seconds: float = 5
+
+    # Пул соединений воркера: постоянные соединения, дополнительные при нагрузке,
+    # ожидание свободного соединения (секунды), пересоздание соединений старше (секунды, -1 - никогда)
+    pool_size: int = 5
+    max_overflow: int = 10
+    pool_timeout: float = 30
+    pool_recycle: int = -1
+    # Проверять соединение перед выдачей из пула
+    pool_pre_ping: bool = False
+    # Кеши подготовленных запросов asyncpg и SQLAlchemy (0 - отключить, например, за pgbouncer)
+    statement_cache_size: int = 100
+    prepared_statement_cache_size: int = 100
+    # Запрос к API, в котором один и тот же запрос к БД выполнен столько раз, считается N+1
+    n_plus_one_threshold: int = 10
 
     model_config = SettingsConfigDict(env_file=".env", extra="ignore")
 
@@ -17,11 +37,67 @@ class DatabaseSettings(BaseSettings):
             f"{self.postgres_host}:{self.postgres_port}/{self.postgres_db}"
         )
 
+    @property
+    def replica_url(self):
+        if not self.postgres_replica_host:
+            return None
+        return (
+            f"postgresql+asyncpg://{self.postgres_user}:{self.postgres_password}@"
+            f"{self.postgres_replica_host}:{self.postgres_replica_port or self.postgres_port}/{self.postgres_db}"
+        )
+
 
 class JWTSettings(BaseSettings):
     secret_key: str
     algorithm: str
     access_token_expire_minutes: int
+    # Сколько секунд флаги пользователя из токена считаются актуальными без обращения к БД
+    principal_revalidate_seconds: int = 60
+
+    model_config = SettingsConfigDict(env_file=".env", extra="ignore")
+
+
+class HashingSettings(BaseSettings):
+    # Пул, в котором выполняется хеширование паролей: потоки или процессы
+    password_hash_executor: Literal["thread", "process"] = "thread"
+    # Сколько паролей хешируется одновременно
+    password_hash_workers: int = 4
+    # Сколько запросов может ждать свободного исполнителя, остальные получают 503
+    password_hash_queue_size: int = 64
+
+    model_config = SettingsConfigDict(env_file=".env", extra="ignore")
+
+
+class CacheSettings(BaseSettings):
+    # Кеш товаров по id: количество записей и время жизни записи в секундах
+    product_cache_size: int = 10000
+    product_cache_ttl: int = 60
+    # Готовые (сериализованные и сжатые) страницы списка товаров
+    catalog_cache_size: int = 256
+    catalog_cache_ttl: int = 30
+    # Страницы меньшего размера (в байтах) не сжимаются
+    catalog_gzip_min_size: int = 1024
+    # Индекс подсказок по наименованиям товаров: количество товаров и длина ключа поиска
+    suggest_max_entries: int = 100000
+    suggest_max_key_length: int = 64
+    # Сверенные с БД данные пользователей (время жизни - JWTSettings.principal_revalidate_seconds)
+    principal_cache_size: int = 10000
+
+    model_config = SettingsConfigDict(env_file=".env", extra="ignore")
+
+
+class BatchSettings(BaseSettings):
+    # Сколько строк импорта товаров проверяется и загружается в БД за один раз
+    product_import_chunk_size: int = 5000
+    # Сколько товаров выгрузки читается из БД одним запросом
+    product_export_chunk_size: int = 1000
+    # Сколько строк корзин удаляется одной транзакцией при удалении товара
+    product_delete_batch_size: int = 1000
+    # Удаление товара без продвижения дольше этого количества секунд считается брошенным
+    # (воркер остановлен) и продолжается другим воркером
+    product_delete_stale_seconds: int = 30
+    # Сколько корзин с измененными товарами получает новую версию одной транзакцией
+    cart_touch_batch_size: int = 1000
 
     model_config = SettingsConfigDict(env_file=".env", extra="ignore")
 
@@ -29,7 +105,12 @@ class JWTSettings(BaseSettings):
 class Settings(BaseSettings):
     db: DatabaseSettings = DatabaseSettings()
     jwt: JWTSettings = JWTSettings(algorithm="HS256", access_token_expire_minutes=30)
+    hashing: HashingSettings = HashingSettings()
+    cache: CacheSettings = CacheSettings()
+    batch: BatchSettings = BatchSettings()
 
+    # Режим отладки: в ответах передается статистика запросов к БД (заголовки X-DB-*)
+    debug: bool = False
     title: str = "Store_API"
     version: str = "0.1.0"
 
@@ -1,12 +1,41 @@
-from fastapi import FastAPI
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
+from sqlalchemy.exc import SQLAlchemyError
 from fastapi.middleware.cors import CORSMiddleware
 from api.users import users_router
 from api.product import product_router
 from api.cart import cart_router
-from config.settings import Settings
+from api.metrics import metrics_router
+from config.db import async_session_maker, engine, pin_to_primary
+from config.settings import Settings, settings
+from services.events import start_listener
+from services.passwords import password_hasher
+from services.product import watch_product_deletions
+from services.query_stats import record_request, track_queries
+from services.suggest import suggest_index
 
+logger = logging.getLogger(__name__)
 
-app = FastAPI(**Settings().model_dump())
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    listener = start_listener(engine.dialect.name)
+    deletion_watcher = asyncio.create_task(watch_product_deletions(async_session_maker))
+    try:
+        async with async_session_maker() as db:
+            await suggest_index.ensure_built(db)
+    except (OSError, SQLAlchemyError):
+        logger.warning("Индекс подсказок не построен при запуске, он будет построен при первом запросе")
+    yield
+    deletion_watcher.cancel()
+    if listener is not None:
+        listener.cancel()
+    password_hasher.shutdown()
+
+
+app = FastAPI(lifespan=lifespan, **Settings().model_dump())
 
 app.add_middleware(
     CORSMiddleware,
@@ -14,8 +43,42 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=("GET", "POST"),
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Next-Cursor"],
 )
 
+
+@app.middleware("http")
+async def read_your_writes(request: Request, call_next):
+    """
+    После успешного изменения данных (обработчики с зависимостью writes_data)
+    клиент некоторое время читает из основной БД.
+    """
+    request.state.writes_data = False
+    response = await call_next(request)
+    if request.state.writes_data and response.status_code < 400:
+        pin_to_primary(request, response)
+    return response
+
+
+@app.middleware("http")
+async def sql_instrumentation(request: Request, call_next):
+    """
+    Считает запросы к БД при обработке запроса к API.
+    """
+    with track_queries() as stats:
+        response = await call_next(request)
+
+    route = request.scope.get("route")
+    record_request(f"{request.method} {route.path}" if route else "unmatched", stats)
+    if settings.debug:
+        response.headers["X-DB-Queries"] = str(stats.statements)
+        response.headers["X-DB-Rows"] = str(stats.rows)
+        response.headers["X-DB-Time-Ms"] = f"{stats.seconds * 1000:.3f}"
+        response.headers["X-DB-Repeated"] = str(stats.repeated)
+    return response
+
+
 app.include_router(users_router)
 app.include_router(product_router)
 app.include_router(cart_router)
+app.include_router(metrics_router)
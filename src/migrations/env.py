@@ -10,6 +10,8 @@ from alembic import context
 from models.users import User  # noqa # pylint:disable=unused-import
 from models.cart_product import CartProduct  # noqa # pylint:disable=unused-import
 from models.product import Product  # noqa # pylint:disable=unused-import
+from models.product_tombstone import ProductTombstone  # noqa # pylint:disable=unused-import
+from models.product_deletion import ProductDeletion  # noqa # pylint:disable=unused-import
 from models.cart import Cart  # noqa # pylint:disable=unused-import
 
 from config.settings import settings
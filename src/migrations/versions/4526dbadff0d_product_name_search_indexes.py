@@ -0,0 +1,40 @@
+"""product name search indexes
+
+Revision ID: 4526dbadff0d
+Revises: 7861a2cd432c
+Create Date: 2026-10-18 19:48:12.304871
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4526dbadff0d'
+down_revision: Union[str, None] = '7861a2cd432c'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    op.create_index(
+        'ix_products_name_tsv',
+        'products',
+        [sa.text("to_tsvector('simple'::regconfig, name)")],
+        postgresql_using='gin',
+    )
+    op.create_index(
+        'ix_products_name_trgm',
+        'products',
+        ['name'],
+        postgresql_using='gin',
+        postgresql_ops={'name': 'gin_trgm_ops'},
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_products_name_trgm', table_name='products')
+    op.drop_index('ix_products_name_tsv', table_name='products')
@@ -9,7 +9,11 @@ class CartProduct(Base):
     cart_id: Mapped[int] = mapped_column(ForeignKey("carts.id", ondelete="CASCADE"), primary_key=True)
     cart: Mapped["Cart"] = relationship(back_populates="products")
 
-    product_id: Mapped[int] = mapped_column(ForeignKey("products.id", ondelete="CASCADE"), primary_key=True)
+    product_id: Mapped[int] = mapped_column(
+        ForeignKey("products.id", ondelete="CASCADE"),
+        primary_key=True,
+        index=True,
+    )
     product: Mapped["Product"] = relationship("Product", lazy="joined", uselist=False)
 
     quantity: Mapped[int] = mapped_column(default=1)
@@ -1,7 +1,7 @@
 from datetime import datetime
-from sqlalchemy import DateTime, func, text
+from sqlalchemy import BigInteger, DateTime, Index, func, text
 from sqlalchemy.orm import Mapped, mapped_column
-from config.db import Base
+from config.db import Base, current_change_seq
 
 
 class Product(Base):
@@ -21,3 +21,32 @@ class Product(Base):
         default=True,
         server_default=text("'false'"),
     )
+    # Номер изменения для ленты изменений товаров (см. config.db.current_change_seq)
+    change_seq: Mapped[int] = mapped_column(
+        BigInteger,
+        server_default=current_change_seq(),
+        onupdate=current_change_seq(),
+    )
+
+
+# Индексы для сортировок и фильтров списка товаров
+Index("ix_products_id_active", Product.id.desc(), postgresql_where=Product.is_active, sqlite_where=Product.is_active)
+Index("ix_products_is_active_price", Product.is_active, Product.price, Product.id)
+Index("ix_products_is_active_name", Product.is_active, Product.name, Product.id)
+# Список товаров администратора (без фильтра по is_active)
+Index("ix_products_price_id", Product.price, Product.id)
+Index("ix_products_name_id", Product.name, Product.id)
+Index("ix_products_updated_at_id", Product.updated_at, Product.id)
+# Лента изменений товаров
+Index("ix_products_change_seq_id", Product.change_seq, Product.id)
+
+# Индексы полнотекстового и нечеткого поиска по наименованию (только Postgres)
+PRODUCT_NAME_TSVECTOR = func.to_tsvector(text("'simple'::regconfig"), Product.name)
+
+Index("ix_products_name_tsv", PRODUCT_NAME_TSVECTOR, postgresql_using="gin").ddl_if(dialect="postgresql")
+Index(
+    "ix_products_name_trgm",
+    Product.name,
+    postgresql_using="gin",
+    postgresql_ops={"name": "gin_trgm_ops"},
+).ddl_if(dialect="postgresql")
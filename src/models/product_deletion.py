@@ -0,0 +1,26 @@
+from datetime import datetime
+from typing import Optional
+from sqlalchemy import DateTime, Index, String, text
+from sqlalchemy.orm import Mapped, mapped_column
+from config.db import Base
+
+
+class ProductDeletion(Base):
+    """Ход фонового удаления товаров (общий для всех воркеров)."""
+
+    product_id: Mapped[int] = mapped_column(primary_key=True, autoincrement=False)
+    # running - выполняется, done - завершено, failed - прервано ошибкой
+    status: Mapped[str] = mapped_column(String(16))
+    deleted_cart_items: Mapped[int] = mapped_column(default=0, server_default=text("0"))
+    started_at: Mapped[datetime] = mapped_column(DateTime(timezone=True))
+    # Время последней обработанной части: по нему находятся удаления, брошенные остановленным воркером
+    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True))
+    finished_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True))
+
+
+Index(
+    "ix_product_deletions_running",
+    ProductDeletion.updated_at,
+    postgresql_where=ProductDeletion.status == "running",
+    sqlite_where=ProductDeletion.status == "running",
+)
@@ -0,0 +1,22 @@
+from datetime import datetime
+from sqlalchemy import BigInteger, DateTime, Index, func
+from sqlalchemy.orm import Mapped, mapped_column
+from config.db import Base, current_change_seq
+
+
+class ProductTombstone(Base):
+    """Отметки об удаленных товарах для ленты изменений."""
+
+    product_id: Mapped[int] = mapped_column(primary_key=True, autoincrement=False)
+    deleted_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        server_default=func.now(),
+    )
+    change_seq: Mapped[int] = mapped_column(
+        BigInteger,
+        server_default=current_change_seq(),
+        onupdate=current_change_seq(),
+    )
+
+
+Index("ix_product_tombstones_change_seq", ProductTombstone.change_seq, ProductTombstone.product_id)
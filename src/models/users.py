@@ -1,5 +1,5 @@
 from typing import Annotated
-from sqlalchemy import text
+from sqlalchemy import Index, func, text
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from config.db import Base
 
@@ -17,4 +17,9 @@ class User(Base):
     is_active: Mapped[bool] = mapped_column(default=True, server_default=text("'false'"))
     is_admin: Mapped[bool] = mapped_column(default=False, server_default=text("'false'"))
 
-    cart: Mapped["Cart"] = relationship(uselist=False, back_populates="user", lazy="joined")
+    cart: Mapped["Cart"] = relationship(uselist=False, back_populates="user", lazy="raise")
+
+
+# Поиск пользователя по email без учета регистра (см. get_user).
+# Email, отличающиеся только регистром, принадлежат одному пользователю.
+Index("ix_users_email_lower", func.lower(User.email), unique=True)
@@ -1,5 +1,5 @@
-from typing import List, Union
-from pydantic import BaseModel, PositiveInt
+from typing import Annotated, List, Literal, Union
+from pydantic import BaseModel, Field, PositiveInt
 
 from schemas.product import ProductReadCart
 
@@ -29,3 +29,20 @@ class CartChangeQuantity(BaseModel):
     message: str = "Количество товара в корзине обновлено"
     total_cost: int
     cart_item: CartProductRead
+
+
+class CartBatchItem(CartProductCreate):
+    action: Literal["add", "set", "remove"] = "add"
+
+
+CartBatch = Annotated[List[CartBatchItem], Field(min_length=1, max_length=500)]
+
+
+class CartBatchError(BaseModel):
+    product_id: int
+    status_code: int
+    detail: str
+
+
+class CartBatchRead(CartRead):
+    errors: List[CartBatchError]
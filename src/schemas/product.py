@@ -1,6 +1,7 @@
 from datetime import datetime
-from typing import Optional, Union
-from pydantic import BaseModel, PositiveInt
+from typing import Annotated, List, Literal, Optional, Union
+from typing_extensions import Self
+from pydantic import BaseModel, Field, PositiveInt, model_validator
 
 
 class ProductBase(BaseModel):
@@ -23,3 +24,88 @@ class ProductPatch(ProductBase):
 
 class ProductReadCart(ProductBase):
     id: int
+
+
+class ProductSuggest(BaseModel):
+    id: int
+    name: str
+
+
+class ProductListQuery(BaseModel):
+    limit: int = Field(50, ge=1, le=500)
+    after_id: Optional[int] = None
+    cursor: Optional[str] = None
+    sort: Literal["newest", "name", "price"] = "newest"
+    min_price: Optional[PositiveInt] = None
+    max_price: Optional[PositiveInt] = None
+    updated_since: Optional[datetime] = None
+
+
+class ProductImportRow(ProductBase):
+    id: Optional[PositiveInt] = None
+
+
+class ProductImportError(BaseModel):
+    line: int
+    detail: str
+
+
+class ProductImportResult(BaseModel):
+    imported: int = 0
+    rejected: int = 0
+    errors: List[ProductImportError] = Field(default_factory=list)
+
+
+class ProductChange(BaseModel):
+    id: int
+    deleted: bool
+    changed_at: datetime
+    product: Optional[ProductRead] = None
+
+
+class ProductChanges(BaseModel):
+    changes: List[ProductChange]
+    cursor: Optional[str]
+    has_more: bool
+
+
+ProductIds = Annotated[List[int], Field(min_length=1, max_length=500)]
+
+
+class ProductBatchItem(BaseModel):
+    id: int
+    status_code: int
+    detail: Optional[str] = None
+    product: Optional[ProductRead] = None
+
+
+class ProductBulkItem(ProductPatch):
+    id: int
+
+
+class ProductBulkPatch(BaseModel):
+    ids: Optional[Annotated[List[int], Field(min_length=1, max_length=10000)]] = None
+    patch: Optional[ProductPatch] = None
+    items: Optional[Annotated[List[ProductBulkItem], Field(min_length=1, max_length=10000)]] = None
+
+    @model_validator(mode="after")
+    def check_one_form(self) -> Self:
+        by_ids = self.ids is not None or self.patch is not None
+        if by_ids == (self.items is not None) or (by_ids and (self.ids is None or self.patch is None)):
+            raise ValueError("Укажите либо ids и patch, либо items.")
+        if self.patch is not None and not self.patch.model_dump(exclude_none=True):
+            raise ValueError("Не указаны изменяемые поля.")
+        return self
+
+
+class ProductBulkResult(BaseModel):
+    updated: List[int]
+    not_found: List[int]
+
+
+class ProductDeletionRead(BaseModel):
+    product_id: int
+    status: Literal["running", "done", "failed"]
+    deleted_cart_items: int
+    started_at: datetime
+    finished_at: Optional[datetime]
@@ -74,3 +74,24 @@ class Token(BaseModel):
 
 class TokenData(BaseModel):
     username: str | None = None
+
+
+class Principal:
+    """
+    Аутентифицированный пользователь, восстановленный из токена.
+    Не связан с сессией БД и не содержит корзину.
+    """
+
+    __slots__ = ("id", "email", "is_admin", "is_active", "checked_at")
+
+    def __init__(self, id: int, email: str, is_admin: bool, is_active: bool, checked_at: float):
+        self.id = id
+        self.email = email
+        self.is_admin = is_admin
+        self.is_active = is_active
+        # Момент (unix time), когда флаги пользователя были сверены с БД
+        self.checked_at = checked_at
+
+    @classmethod
+    def from_claims(cls, payload: dict) -> "Principal":
+        return cls(payload["uid"], payload["sub"], payload["adm"], payload["act"], payload["iat"])
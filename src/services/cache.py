@@ -0,0 +1,85 @@
+import time
+from collections import OrderedDict
+from typing import Any, Hashable
+
+# Признак отсутствия записи в кеше (None - допустимое кешируемое значение)
+MISSING = object()
+
+
+class LRUCache:
+    """
+    Кеш процесса с вытеснением давно не использованных записей и временем жизни записей.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.items: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        # Меняется при каждой инвалидации. Значение, прочитанное из БД до инвалидации,
+        # не должно попасть в кеш после нее.
+        self.generation = 0
+        # Время последней инвалидации (time.monotonic())
+        self.invalidated_at = 0.0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def get(self, key: Hashable) -> Any:
+        """
+        Возвращает значение по ключу или MISSING, если записи нет или она устарела.
+        """
+        entry = self.items.get(key)
+        if entry is None:
+            self.misses += 1
+            return MISSING
+
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self.items[key]
+            self.expirations += 1
+            self.misses += 1
+            return MISSING
+
+        self.items.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any, generation: int | None = None):
+        """
+        Сохраняет значение. Если передано поколение, полученное до чтения значения из БД,
+        и кеш с тех пор инвалидировался, значение не сохраняется.
+        """
+        if generation is not None and generation != self.generation:
+            return
+        self.items[key] = (time.monotonic() + self.ttl, value)
+        self.items.move_to_end(key)
+        while len(self.items) > self.maxsize:
+            self.items.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, key: Hashable):
+        self.generation += 1
+        self.invalidated_at = time.monotonic()
+        if self.items.pop(key, None) is not None:
+            self.invalidations += 1
+
+    def clear(self):
+        self.generation += 1
+        self.invalidated_at = time.monotonic()
+        self.invalidations += len(self.items)
+        self.items.clear()
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self.items),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+        }
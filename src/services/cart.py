@@ -1,27 +1,28 @@
-from typing import List
+from typing import Dict, List, Tuple
 from fastapi import HTTPException
-from sqlalchemy import and_, delete, select
+from sqlalchemy import and_, delete, func, literal, select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from config.db import get_insert
 from models.cart import Cart
 from models.cart_product import CartProduct
+from models.product import Product
 from models.users import User
-from schemas.cart import CartChange, CartChangeQuantity, CartProductCreate, CartProductRead, CartRead
+from schemas.cart import (
+    CartBatchError,
+    CartBatchItem,
+    CartBatchRead,
+    CartChange,
+    CartChangeQuantity,
+    CartProductCreate,
+    CartProductRead,
+    CartRead,
+)
 from schemas.product import ProductReadCart
+from schemas.users import Principal
 from services.product import product_read
 
 
-def search_product_in_cart(cart, product_id):
-    """
-    Поиск товара в корзине.
-    Если товар найден, возвращает его индекс в коризне.
-    """
-    for index, product in enumerate(cart.products):
-        if product.product_id == product_id:
-            return index
-    return -1
-
-
 def get_cart_item(product, quantity):
     product = ProductReadCart.model_validate(product, from_attributes=True)
     return CartProductRead(product=product, quantity=quantity)
@@ -33,137 +34,323 @@ async def create_cart(user: User, db: AsyncSession):
     await db.commit()
 
 
-async def get_cart_product(cart_id: int, product_id: int, db) -> CartProduct:
+def user_cart_id(user: Principal):
+    """
+    Подзапрос id корзины пользователя.
+    """
+    return select(Cart.id).where(Cart.user_id == user.id).scalar_subquery()
+
+
+async def touch_cart(cart_id, db: AsyncSession):
     """
-    Поиск записи товара в связанной таблице корзины.
+    Увеличивает версию корзины. Вызывается при каждом изменении корзины до фиксации транзакции.
+    cart_id - id корзины или подзапрос, возвращающий его.
     """
+    stmt = (
+        update(Cart)
+        .where(Cart.id == cart_id)
+        .values(version=Cart.version + 1)
+        .execution_options(synchronize_session=False)
+    )
+    await db.execute(stmt)
+
+
+async def get_cart_version(user: Principal, db: AsyncSession) -> str:
+    """
+    Возвращает ETag корзины пользователя: id корзины и ее версию.
+    Версия меняется при изменении корзины и (в фоне) при изменении товаров в ней.
+    """
+    response = await db.execute(select(Cart.id, Cart.version).where(Cart.user_id == user.id))
+    cart = response.one()
+    return f'"{cart.id}-{cart.version}"'
 
-    query = select(CartProduct).where(
-        and_(
-            CartProduct.cart_id == cart_id,
+
+async def change_cart_product_quantity(product_id: int, user: Principal, delta: int, db: AsyncSession):
+    """
+    Изменяет количество товара в корзине одним запросом UPDATE ... RETURNING.
+    Количество не может стать меньше единицы.
+    Возвращает id корзины и новое количество или None, если подходящей записи нет.
+    """
+    stmt = (
+        update(CartProduct)
+        .where(
+            CartProduct.cart_id == user_cart_id(user),
             CartProduct.product_id == product_id,
+            CartProduct.quantity + delta > 0,
         )
+        .values(quantity=CartProduct.quantity + delta)
+        .returning(CartProduct.cart_id, CartProduct.quantity)
+        .execution_options(synchronize_session=False)
+    )
+    response = await db.execute(stmt)
+    return response.first()
+
+
+async def load_cart_item(cart_id: int, product_id: int, quantity: int, db: AsyncSession) -> CartChangeQuantity:
+    """
+    Получение товара из корзины и стоимости корзины одним запросом.
+    """
+    total_cost = (
+        select(func.sum(CartProduct.quantity * Product.price))
+        .join(Product, Product.id == CartProduct.product_id)
+        .where(CartProduct.cart_id == cart_id)
+        .scalar_subquery()
     )
+    query = select(
+        Product.id,
+        Product.name,
+        Product.price,
+        Product.is_active,
+        total_cost.label("total_cost"),
+    ).where(Product.id == product_id)
     response = await db.execute(query)
-    cart_product = response.scalars().first()
-    if not cart_product:
-        raise HTTPException(status_code=404, detail="Товар в корзине не найден")
+    row = response.one()
 
-    return cart_product
+    return CartChangeQuantity(
+        message="Количество товара в корзине обновлено",
+        cart_item=get_cart_item(row, quantity),
+        total_cost=row.total_cost,
+    )
 
 
-async def add_cart_product(cart_product: CartProductCreate, user: User, db: AsyncSession) -> List[CartProductCreate]:
+async def add_cart_product(cart_product: CartProductCreate, user: Principal, db: AsyncSession) -> CartRead:
     """
     Добавляет товар в корзину.
+    Запись создается или увеличивается одним запросом (INSERT ... ON CONFLICT DO UPDATE),
+    поэтому параллельные добавления одного товара не теряют количество.
     """
-    cart: Cart = user.cart
+    source = (
+        select(Cart.id, Product.id, literal(cart_product.quantity))
+        .join(Product, Product.id == cart_product.product_id)
+        .where(Cart.user_id == user.id)
+    )
+    if not user.is_admin:
+        source = source.where(Product.is_active)
+
+    insert = get_insert(db)
+    stmt = insert(CartProduct).from_select(["cart_id", "product_id", "quantity"], source)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[CartProduct.cart_id, CartProduct.product_id],
+        set_={"quantity": CartProduct.quantity + stmt.excluded.quantity},
+    ).returning(CartProduct.cart_id)
+    response = await db.execute(stmt)
+    cart_id = response.scalar()
+
+    if cart_id is None:
+        # Товар не добавлен: выясняем причину (товар не найден или неактивен)
+        await product_read(user, cart_product.product_id, db)
+        raise HTTPException(status_code=404, detail="Товар не найден")
+
+    await touch_cart(cart_id, db)
+    await db.commit()
+    return await load_cart(cart_id, db)
 
-    await product_read(user, cart_product.product_id, db)
 
-    product_index_in_cart = search_product_in_cart(cart, cart_product.product_id)
-    if product_index_in_cart != -1:
-        cart.products[product_index_in_cart].quantity += cart_product.quantity
-    else:
-        cart_product_dump = cart_product.model_dump()
-        cart_product_dump["cart_id"] = cart.id
-        entry_cart_product = CartProduct(**cart_product_dump)
-        db.add(entry_cart_product)
+def fold_cart_batch(items: List[CartBatchItem]) -> Dict[int, Tuple[str, int]]:
+    """
+    Сворачивает операции пакета в одно итоговое действие на товар с учетом их порядка:
+    ("add", n) - увеличить количество на n, ("set", n) - установить количество n (0 - удалить).
+    """
+    actions = {}
+    for item in items:
+        quantity = item.quantity or 1
+        if item.action == "remove":
+            actions[item.product_id] = ("set", 0)
+        elif item.action == "set":
+            actions[item.product_id] = ("set", quantity)
+        elif item.product_id in actions:
+            action, previous = actions[item.product_id]
+            actions[item.product_id] = (action, previous + quantity)
+        else:
+            actions[item.product_id] = ("add", quantity)
+    return actions
+
+
+async def apply_cart_batch(items: List[CartBatchItem], user: Principal, db: AsyncSession) -> CartBatchRead:
+    """
+    Применяет пакет операций с корзиной в одной транзакции.
+    Добавления, установки количества и удаления выполняются тремя запросами на весь пакет.
+    Несуществующие и неактивные товары пропускаются и возвращаются в списке ошибок.
+    """
+    actions = fold_cart_batch(items)
+
+    cart_id = (await db.execute(select(Cart.id).where(Cart.user_id == user.id))).scalar_one()
+
+    product_ids = [product_id for product_id, (_, quantity) in actions.items() if quantity]
+    response = await db.execute(select(Product.id, Product.is_active).where(Product.id.in_(product_ids)))
+    active = {row.id: row.is_active for row in response}
+
+    errors = []
+    added, updated, removed = [], [], []
+    for product_id, (action, quantity) in actions.items():
+        if not quantity:
+            removed.append(product_id)
+            continue
+        if product_id not in active:
+            errors.append(CartBatchError(product_id=product_id, status_code=404, detail="Товар не найден"))
+            continue
+        if not active[product_id] and not user.is_admin:
+            errors.append(CartBatchError(product_id=product_id, status_code=423, detail="Товар неактивен"))
+            continue
+        row = {"cart_id": cart_id, "product_id": product_id, "quantity": quantity}
+        (added if action == "add" else updated).append(row)
+
+    insert = get_insert(db)
+    for rows, is_increment in ((added, True), (updated, False)):
+        if not rows:
+            continue
+        stmt = insert(CartProduct).values(rows)
+        quantity = CartProduct.quantity + stmt.excluded.quantity if is_increment else stmt.excluded.quantity
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[CartProduct.cart_id, CartProduct.product_id],
+            set_={"quantity": quantity},
+        )
+        await db.execute(stmt)
+
+    if removed:
+        stmt = (
+            delete(CartProduct)
+            .where(CartProduct.cart_id == cart_id, CartProduct.product_id.in_(removed))
+            .execution_options(synchronize_session=False)
+        )
+        await db.execute(stmt)
 
+    if added or updated or removed:
+        await touch_cart(cart_id, db)
     await db.commit()
-    await db.refresh(cart)
-    return await get_cart(user)
+    cart = await load_cart(cart_id, db)
+    return CartBatchRead(total_cost=cart.total_cost, cart=cart.cart, errors=errors)
 
 
-async def delete_cart_product(product_id: int, user: User, db: AsyncSession) -> CartChange:
+async def delete_cart_product(product_id: int, user: Principal, db: AsyncSession) -> CartChange:
     """
     Удаляет товар из корзины.
     """
 
-    stmt = delete(CartProduct).where(
-        and_(
-            CartProduct.cart_id == user.cart.id,
-            CartProduct.product_id == product_id,
+    stmt = (
+        delete(CartProduct)
+        .where(
+            and_(
+                CartProduct.cart_id == user_cart_id(user),
+                CartProduct.product_id == product_id,
+            )
         )
+        .returning(CartProduct.cart_id)
+        .execution_options(synchronize_session=False)
     )
     response = await db.execute(stmt)
-    deleted_count = response.rowcount
-    if deleted_count == 0:
+    cart_id = response.scalar()
+    if cart_id is None:
         raise HTTPException(status_code=404, detail="Товар в корзине не найден")
 
+    await touch_cart(cart_id, db)
     await db.commit()
-    await db.refresh(user)
-    cart = await get_cart(user)
-    cart = [cart_item.model_dump() for cart_item in cart.cart]
+    cart = await load_cart(cart_id, db)
     return CartChange(
         message="Товар удален из корзины",
-        cart=cart,
-        total_cost=user.cart.get_total_cost(),
+        cart=cart.cart,
+        total_cost=cart.total_cost,
     )
 
 
-async def delete_all_cart_products(user: User, db: AsyncSession) -> CartChange:
+async def delete_all_cart_products(user: Principal, db: AsyncSession) -> CartChange:
     """
     Удаляет все товары из корзины.
     """
 
-    stmt = delete(CartProduct).where(CartProduct.cart_id == user.cart.id)
+    stmt = (
+        delete(CartProduct)
+        .where(CartProduct.cart_id == user_cart_id(user))
+        .execution_options(synchronize_session=False)
+    )
     await db.execute(stmt)
+    await touch_cart(user_cart_id(user), db)
     await db.commit()
-    await db.refresh(user)
-
-    cart = await get_cart(user)
-    cart = cart.model_dump()
-    cart["message"] = "Корзина очищена"
 
-    return CartChange(**cart)
+    return CartChange(message="Корзина очищена", total_cost=0, cart=[])
 
 
-async def add_quantity_cart_product(product_id: int, user: User, db: AsyncSession):
+async def add_quantity_cart_product(product_id: int, user: Principal, db: AsyncSession):
     """
     Добавить единицу товара в корзине.
     """
+    changed = await change_cart_product_quantity(product_id, user, 1, db)
+    if changed is None:
+        raise HTTPException(status_code=404, detail="Товар в корзине не найден")
 
-    cart_item = await get_cart_product(user.cart.id, product_id, db)
-    cart_item.quantity += 1
+    await touch_cart(changed.cart_id, db)
     await db.commit()
-    await db.refresh(cart_item)
-
-    return CartChangeQuantity(
-        message="Количество товара в корзине обновлено",
-        cart_item=get_cart_item(cart_item.product, cart_item.quantity),
-        total_cost=user.cart.get_total_cost(),
-    )
+    return await load_cart_item(changed.cart_id, product_id, changed.quantity, db)
 
 
-async def sub_quantity_cart_product(product_id: int, user: User, db: AsyncSession):
+async def sub_quantity_cart_product(product_id: int, user: Principal, db: AsyncSession):
     """
     Отнять единицу товара в корзине.
+    Если осталась последняя единица, товар удаляется из корзины в той же транзакции.
     """
-
-    cart_item = await get_cart_product(user.cart.id, product_id, db)
-
-    if cart_item.quantity > 1:
-        cart_item.quantity -= 1
-    else:
-        return await delete_cart_product(product_id, user, db)
-
+    changed = await change_cart_product_quantity(product_id, user, -1, db)
+    if changed is not None:
+        await touch_cart(changed.cart_id, db)
+        await db.commit()
+        return await load_cart_item(changed.cart_id, product_id, changed.quantity, db)
+
+    stmt = (
+        delete(CartProduct)
+        .where(
+            CartProduct.cart_id == user_cart_id(user),
+            CartProduct.product_id == product_id,
+            CartProduct.quantity <= 1,
+        )
+        .returning(CartProduct.cart_id)
+        .execution_options(synchronize_session=False)
+    )
+    response = await db.execute(stmt)
+    cart_id = response.scalar()
+
+    if cart_id is None:
+        # Количество могли увеличить параллельным запросом между UPDATE и DELETE
+        changed = await change_cart_product_quantity(product_id, user, -1, db)
+        if changed is None:
+            raise HTTPException(status_code=404, detail="Товар в корзине не найден")
+        await touch_cart(changed.cart_id, db)
+        await db.commit()
+        return await load_cart_item(changed.cart_id, product_id, changed.quantity, db)
+
+    await touch_cart(cart_id, db)
     await db.commit()
-    await db.refresh(cart_item)
+    cart = await load_cart(cart_id, db)
+    return CartChange(message="Товар удален из корзины", total_cost=cart.total_cost, cart=cart.cart)
 
-    return CartChangeQuantity(
-        message="Количество товара в корзине обновлено",
-        cart_item=get_cart_item(cart_item.product, cart_item.quantity),
-        total_cost=user.cart.get_total_cost(),
+
+async def load_cart(cart_id, db: AsyncSession) -> CartRead:
+    """
+    Получение списка товаров и стоимости корзины одним запросом.
+    Стоимость считается в БД (SUM(quantity * price)) по текущим ценам товаров.
+    cart_id - id корзины или подзапрос, возвращающий его.
+    """
+    total_cost = func.sum(CartProduct.quantity * Product.price).over()
+    query = (
+        select(
+            CartProduct.quantity,
+            Product.id,
+            Product.name,
+            Product.price,
+            Product.is_active,
+            total_cost.label("total_cost"),
+        )
+        .join(Product, Product.id == CartProduct.product_id)
+        .where(CartProduct.cart_id == cart_id)
+        .order_by(CartProduct.product_id)
     )
+    response = await db.execute(query)
+    rows = response.all()
+
+    cart_items = [get_cart_item(row, row.quantity) for row in rows]
+    return CartRead(total_cost=rows[0].total_cost if rows else 0, cart=cart_items)
 
 
-async def get_cart(user: User) -> CartRead:
+async def get_cart(user: Principal, db: AsyncSession) -> CartRead:
     """
     Получение списка товаров из корзины.
     """
-
-    products = user.cart.products
-    cart_items = [get_cart_item(item.product, item.quantity) for item in products]
-    total_cost = user.cart.get_total_cost()
-
-    return CartRead(total_cost=total_cost, cart=cart_items)
+    return await load_cart(user_cart_id(user), db)
@@ -0,0 +1,109 @@
+import asyncio
+import json
+import logging
+import uuid
+from collections import defaultdict
+from typing import Callable, Dict, List
+
+import asyncpg
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# Канал Postgres, через который воркеры сообщают друг другу об изменениях данных
+CHANNEL = "store_invalidation"
+# Ограничение размера уведомления pg_notify (8000 байт, не включительно)
+MAX_PAYLOAD_BYTES = 8000
+# Идентификатор процесса: собственные события воркер уже обработал и пропускает
+WORKER_ID = uuid.uuid4().hex
+
+# Обработчики событий по типу сущности ("product", "user")
+handlers: Dict[str, List[Callable[[dict], None]]] = defaultdict(list)
+
+
+def subscribe(entity: str, handler: Callable[[dict], None]):
+    """
+    Регистрирует обработчик событий об изменении сущности.
+    Событие без "id" означает, что могли измениться любые записи (например, после
+    переподключения слушателя, когда часть событий потеряна).
+    """
+    handlers[entity].append(handler)
+
+
+def dispatch(event: dict):
+    for handler in handlers.get(event.get("entity"), []):
+        try:
+            handler(event)
+        except Exception:
+            logger.exception("Ошибка обработки события %s", event)
+
+
+def event_payload(entity: str, **data) -> str:
+    """
+    Сериализует событие. Postgres не принимает уведомления от MAX_PAYLOAD_BYTES байт,
+    поэтому слишком большое событие заменяется событием без "id" (могли измениться любые записи).
+    """
+    payload = json.dumps({"entity": entity, "origin": WORKER_ID, **data}, default=str)
+    if len(payload.encode()) >= MAX_PAYLOAD_BYTES:
+        payload = json.dumps({"entity": entity, "origin": WORKER_ID})
+    return payload
+
+
+async def publish(db: AsyncSession, entity: str, **data):
+    """
+    Публикует событие об изменении сущности в транзакции сессии.
+    Другие воркеры получат его только после фиксации транзакции.
+    Вне Postgres (тесты на SQLite) публиковать некому.
+    """
+    if db.bind.dialect.name != "postgresql":
+        return
+
+    await db.execute(select(func.pg_notify(CHANNEL, event_payload(entity, **data))))
+
+
+def on_notification(connection, pid, channel, payload):
+    event = json.loads(payload)
+    if event.get("origin") != WORKER_ID:
+        dispatch(event)
+
+
+async def listen():
+    """
+    Слушает канал событий до отмены задачи, переподключаясь при обрыве соединения.
+    """
+    dsn = settings.db.url.replace("postgresql+asyncpg://", "postgresql://", 1)
+    delay = 1
+    while True:
+        connection = None
+        try:
+            connection = await asyncpg.connect(dsn)
+            closed = asyncio.Event()
+            connection.add_termination_listener(lambda _, event=closed: event.set())
+            await connection.add_listener(CHANNEL, on_notification)
+            delay = 1
+
+            # Пока соединения не было, события могли быть пропущены
+            for entity in list(handlers):
+                dispatch({"entity": entity})
+
+            await closed.wait()
+            logger.warning("Соединение для прослушивания событий разорвано")
+        except (OSError, asyncpg.PostgresError, asyncpg.InterfaceError):
+            logger.warning("Нет соединения для прослушивания событий, повтор через %s с", delay)
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 30)
+        finally:
+            if connection is not None and not connection.is_closed():
+                await connection.close()
+
+
+def start_listener(dialect: str) -> asyncio.Task | None:
+    """
+    Запускает фоновую задачу прослушивания событий (только для Postgres).
+    """
+    if dialect != "postgresql":
+        return None
+    return asyncio.create_task(listen())
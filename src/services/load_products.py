@@ -0,0 +1,54 @@
+import argparse
+import asyncio
+import sys
+
+from fastapi import BackgroundTasks, HTTPException
+
+from config.db import async_session_maker
+from services.product_import import import_products
+
+from models.cart_product import CartProduct  # noqa # pylint:disable=unused-import
+from models.cart import Cart  # noqa # pylint:disable=unused-import
+from models.product import Product  # noqa # pylint:disable=unused-import
+
+# Размер блока чтения файла импорта в байтах
+READ_SIZE = 1024 * 1024
+
+
+async def read_file(path: str):
+    with open(path, "rb") if path != "-" else sys.stdin.buffer as file:
+        while chunk := await asyncio.to_thread(file.read, READ_SIZE):
+            yield chunk
+
+
+async def import_file(path: str, format: str):
+    """
+    Импортирует товары из файла CSV или NDJSON.
+    """
+
+    print(f"\nИмпорт товаров из {path}.\n")
+
+    background_tasks = BackgroundTasks()
+    async with async_session_maker() as db:
+        try:
+            result = await import_products(read_file(path), format, db, background_tasks, async_session_maker)
+        except HTTPException as e:
+            print("При импорте товаров произошли ошибки:")
+            print(f"- {e.detail}")
+            return
+    await background_tasks()
+
+    for error in result.errors:
+        print(f"Строка {error.line}: {error.detail}")
+    print(f"\nЗагружено: {result.imported}")
+    print(f"Отклонено: {result.rejected}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Импорт товаров из файла CSV или NDJSON.")
+    parser.add_argument("path", help="Путь к файлу (- для чтения из stdin)")
+    parser.add_argument("--format", choices=["csv", "ndjson"], help="Формат файла (по умолчанию по расширению)")
+    args = parser.parse_args()
+
+    file_format = args.format or ("csv" if args.path.endswith(".csv") else "ndjson")
+    asyncio.run(import_file(args.path, file_format))
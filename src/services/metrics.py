@@ -0,0 +1,18 @@
+from typing import Callable, Dict
+
+# Источники метрик процесса по имени раздела
+collectors: Dict[str, Callable[[], dict]] = {}
+
+
+def register_metrics(name: str, collector: Callable[[], dict]):
+    """
+    Регистрирует функцию, возвращающую метрики раздела.
+    """
+    collectors[name] = collector
+
+
+def collect_metrics() -> dict:
+    """
+    Собирает метрики всех зарегистрированных разделов.
+    """
+    return {name: collector() for name, collector in collectors.items()}
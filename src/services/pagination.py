@@ -0,0 +1,34 @@
+import base64
+import json
+from datetime import datetime
+
+from fastapi import HTTPException
+
+
+def encode_cursor(data: dict) -> str:
+    """
+    Упаковывает позицию в выборке в непрозрачную строку-курсор.
+    """
+    raw = json.dumps(data, separators=(",", ":"), default=str).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, **fields: type) -> dict:
+    """
+    Распаковывает курсор, полученный от клиента.
+    Поля типа datetime передаются в курсоре строкой в формате ISO.
+    Если курсор поврежден или поля в нем не соответствуют ожидаемым типам, возвращает ошибку 400.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        data = json.loads(raw)
+        for key, type_ in fields.items():
+            if type_ is datetime and isinstance(data.get(key), str):
+                data[key] = datetime.fromisoformat(data[key])
+    except (ValueError, AttributeError):
+        data = None
+
+    if not isinstance(data, dict) or any(not isinstance(data.get(key), type_) for key, type_ in fields.items()):
+        raise HTTPException(status_code=400, detail="Некорректный курсор")
+
+    return data
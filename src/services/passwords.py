@@ -0,0 +1,108 @@
+import asyncio
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+
+from fastapi import HTTPException, status
+from passlib.context import CryptContext
+
+from config.settings import settings
+from services.metrics import register_metrics
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+
+def hash_password(password: str) -> str:
+    return pwd_context.hash(password)
+
+
+def check_password(plain_password: str, password: str) -> bool:
+    return pwd_context.verify(plain_password, password)
+
+
+class PasswordHasher:
+    """
+    Выполняет хеширование паролей в отдельном пуле, не блокируя цикл событий.
+    Одновременно выполняется не больше workers задач, ожидать может не больше queue_size.
+    """
+
+    def __init__(self, executor: str, workers: int, queue_size: int):
+        self.executor_type = executor
+        self.workers = workers
+        self.queue_size = queue_size
+        self.executor: Executor | None = None
+        self.semaphore: asyncio.Semaphore | None = None
+
+        self.queued = 0
+        self.running = 0
+        self.completed = 0
+        self.rejected = 0
+        self.wait_seconds = 0.0
+        self.run_seconds = 0.0
+
+    def get_executor(self) -> Executor:
+        if self.executor is None:
+            if self.executor_type == "process":
+                self.executor = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="password-hash")
+            self.semaphore = asyncio.Semaphore(self.workers)
+        return self.executor
+
+    async def run(self, func, *args):
+        executor = self.get_executor()
+        if self.queued >= self.queue_size:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Сервер перегружен, повторите попытку позже.",
+            )
+
+        started = time.perf_counter()
+        self.queued += 1
+        try:
+            await self.semaphore.acquire()
+        finally:
+            self.queued -= 1
+
+        acquired = time.perf_counter()
+        self.wait_seconds += acquired - started
+        self.running += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(executor, func, *args)
+        finally:
+            self.running -= 1
+            self.completed += 1
+            self.run_seconds += time.perf_counter() - acquired
+            self.semaphore.release()
+
+    async def hash(self, password: str) -> str:
+        return await self.run(hash_password, password)
+
+    async def verify(self, plain_password: str, password: str) -> bool:
+        return await self.run(check_password, plain_password, password)
+
+    def stats(self) -> dict:
+        return {
+            "executor": self.executor_type,
+            "workers": self.workers,
+            "queue_size": self.queue_size,
+            "queued": self.queued,
+            "running": self.running,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "wait_seconds": round(self.wait_seconds, 6),
+            "run_seconds": round(self.run_seconds, 6),
+        }
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+
+password_hasher = PasswordHasher(
+    settings.hashing.password_hash_executor,
+    settings.hashing.password_hash_workers,
+    settings.hashing.password_hash_queue_size,
+)
+register_metrics("password_hashing", password_hasher.stats)
@@ -1,12 +1,123 @@
-from typing import List, Union
-from fastapi import HTTPException
+import asyncio
+import gzip
+import logging
+import time
+import zlib
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, List, Optional, Set, Tuple, Union
+from fastapi import BackgroundTasks, HTTPException
 from fastapi.responses import JSONResponse
-from sqlalchemy import delete, select
-from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import (
+    Boolean,
+    Integer,
+    String,
+    and_,
+    bindparam,
+    case,
+    cast,
+    column,
+    delete,
+    func,
+    literal,
+    literal_column,
+    or_,
+    select,
+    tuple_,
+    union_all,
+    update,
+)
+from sqlalchemy.dialects.postgresql import ARRAY
+from pydantic import TypeAdapter
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 
-from models.product import Product
-from models.users import User
-from schemas.product import ProductBase, ProductRead
+from config.db import change_watermark, current_change_seq, get_insert, is_replica
+from models.cart import Cart
+from models.cart_product import CartProduct
+from models.product import PRODUCT_NAME_TSVECTOR, Product
+from models.product_deletion import ProductDeletion
+from models.product_tombstone import ProductTombstone
+from schemas.product import (
+    ProductBase,
+    ProductBatchItem,
+    ProductBulkPatch,
+    ProductBulkResult,
+    ProductChange,
+    ProductChanges,
+    ProductListQuery,
+    ProductRead,
+)
+from config.settings import settings
+from schemas.users import Principal
+from services.cache import MISSING, LRUCache
+from services.events import publish, subscribe
+from services.metrics import register_metrics
+from services.pagination import decode_cursor, encode_cursor
+from services.suggest import suggest_index
+
+logger = logging.getLogger(__name__)
+
+# Товары по id; None - товара не существует
+product_cache = LRUCache(settings.cache.product_cache_size, settings.cache.product_cache_ttl)
+register_metrics("product_cache", product_cache.stats)
+
+# Готовые страницы списка товаров по (админ, параметры запроса)
+catalog_cache = LRUCache(settings.cache.catalog_cache_size, settings.cache.catalog_cache_ttl)
+register_metrics("catalog_cache", catalog_cache.stats)
+
+product_list_adapter = TypeAdapter(List[ProductRead])
+
+# Поля ключа пагинации для каждого вида сортировки списка товаров и их типы в курсоре
+PRODUCT_SORT_KEYS = {
+    "newest": {"id": int},
+    "name": {"name": str, "id": int},
+    "price": {"price": int, "id": int},
+}
+
+
+class CatalogPage:
+    """
+    Сериализованная страница списка товаров.
+    """
+
+    __slots__ = ("body", "gzip_body", "next_cursor")
+
+    def __init__(self, body: bytes, gzip_body: Optional[bytes], next_cursor: Optional[str]):
+        self.body = body
+        self.gzip_body = gzip_body
+        self.next_cursor = next_cursor
+
+
+def may_cache(cache: LRUCache, db: AsyncSession) -> bool:
+    """
+    Проверяет, можно ли кешировать прочитанные из сессии данные.
+    Реплика может еще не содержать изменений, после которых кеш был сброшен.
+    """
+    if not is_replica(db):
+        return True
+    return time.monotonic() - cache.invalidated_at > settings.db.read_your_writes_seconds
+
+
+def invalidate_product(product_id: int):
+    """
+    Сбрасывает закешированные данные товара после его изменения.
+    """
+    product_cache.invalidate(product_id)
+    catalog_cache.clear()
+
+
+def on_product_event(event: dict):
+    """
+    Сбрасывает кеши после изменения товара другим воркером.
+    """
+    if event.get("id") is None:
+        product_cache.clear()
+        catalog_cache.clear()
+    else:
+        invalidate_product(event["id"])
+
+
+subscribe("product", on_product_event)
 
 
 async def product_create(data: ProductBase, db: AsyncSession) -> ProductRead:
@@ -15,76 +126,689 @@ async def product_create(data: ProductBase, db: AsyncSession) -> ProductRead:
     """
     item = Product(**data.model_dump())
     db.add(item)
+    await db.flush()
+    await publish(db, "product", id=item.id, name=item.name, is_active=item.is_active)
     await db.commit()
     await db.refresh(item)
-    return ProductRead.model_validate(item, from_attributes=True)
+    product = ProductRead.model_validate(item, from_attributes=True)
+    catalog_cache.clear()
+    product_cache.set(product.id, product)
+    suggest_index.update(product.id, product.name, product.is_active)
+    return product
 
 
-async def get_product_by_id(product_id: int, db: AsyncSession, user: Union[User, None] = None) -> Product:
+def check_product_access(item: Union[Product, ProductRead, None], user: Union[Principal, None] = None):
     """
-    Возвращает товар по его id.
+    Проверяет, что товар существует и доступен пользователю.
+    Неактивные товары доступны только администратору.
     """
-    query = select(Product).where(Product.id == product_id)
-    response = await db.execute(query)
-    item = response.scalars().first()
     if not item:
         raise HTTPException(status_code=404, detail="Товар не найден")
     if (not user or (user and not user.is_admin)) and not item.is_active:
         raise HTTPException(status_code=423, detail="Товар неактивен")
 
+
+async def get_product_by_id(product_id: int, db: AsyncSession, user: Union[Principal, None] = None) -> Product:
+    """
+    Возвращает товар по его id.
+    """
+    query = select(Product).where(Product.id == product_id)
+    response = await db.execute(query)
+    item = response.scalars().first()
+    check_product_access(item, user)
+
     return item
 
 
-async def product_update(product_id: int, data: ProductBase, db: AsyncSession) -> ProductRead:
+async def get_cached_product(product_id: int, db: AsyncSession) -> Union[ProductRead, None]:
+    """
+    Возвращает товар по его id из кеша процесса, при промахе - из БД.
+    Отсутствие товара тоже кешируется.
+    """
+    item = product_cache.get(product_id)
+    if item is MISSING:
+        generation = product_cache.generation
+        query = select(Product).where(Product.id == product_id)
+        response = await db.execute(query)
+        product = response.scalars().first()
+        item = ProductRead.model_validate(product, from_attributes=True) if product else None
+        if may_cache(product_cache, db):
+            product_cache.set(product_id, item, generation)
+
+    return item
+
+
+async def get_cached_products(product_ids: List[int], db: AsyncSession) -> dict:
+    """
+    Возвращает товары по списку id (см. get_cached_product): отсутствующие в кеше
+    товары читаются из БД одним запросом.
+    """
+    items = {}
+    missed = []
+    for product_id in dict.fromkeys(product_ids):
+        item = product_cache.get(product_id)
+        if item is MISSING:
+            missed.append(product_id)
+        else:
+            items[product_id] = item
+
+    if missed:
+        generation = product_cache.generation
+        response = await db.execute(select(Product).where(Product.id.in_(missed)))
+        found = {item.id: ProductRead.model_validate(item, from_attributes=True) for item in response.scalars()}
+        cacheable = may_cache(product_cache, db)
+        for product_id in missed:
+            items[product_id] = found.get(product_id)
+            if cacheable:
+                product_cache.set(product_id, items[product_id], generation)
+
+    return items
+
+
+async def get_change_seq(db: AsyncSession) -> int:
+    """
+    Номер изменения текущей транзакции (см. config.db.current_change_seq). Строки, измененные
+    транзакцией после вызова, получают номер не меньше возвращенного.
+    """
+    response = await db.execute(select(current_change_seq()))
+    return response.scalar_one()
+
+
+async def touch_carts_changed_since(change_seq: int, session_maker: async_sessionmaker):
+    """
+    Увеличивает версию корзин, в которых лежат товары с номером изменения не меньше change_seq.
+    Выполняется в фоне после фиксации изменения товаров частями по settings.batch.cart_touch_batch_size
+    корзин (каждая часть - отдельная короткая транзакция), поэтому изменение товаров не блокирует
+    корзины одной долгой транзакцией.
+    """
+    batch_size = settings.batch.cart_touch_batch_size
+    last_cart_id = 0
+    try:
+        while True:
+            async with session_maker() as db:
+                batch = (
+                    select(CartProduct.cart_id)
+                    .join(Product, Product.id == CartProduct.product_id)
+                    .where(Product.change_seq >= change_seq, CartProduct.cart_id > last_cart_id)
+                    .group_by(CartProduct.cart_id)
+                    .order_by(CartProduct.cart_id)
+                    .limit(batch_size)
+                )
+                response = await db.execute(batch)
+                cart_ids = response.scalars().all()
+                if cart_ids:
+                    stmt = (
+                        update(Cart)
+                        .where(Cart.id.in_(cart_ids))
+                        .values(version=Cart.version + 1)
+                        .execution_options(synchronize_session=False)
+                    )
+                    await db.execute(stmt)
+                    await db.commit()
+            if len(cart_ids) < batch_size:
+                break
+            last_cart_id = cart_ids[-1]
+    except Exception:
+        logger.exception("Ошибка обновления версий корзин после изменения товаров")
+
+
+async def product_update(
+    product_id: int,
+    data: ProductBase,
+    db: AsyncSession,
+    background_tasks: BackgroundTasks,
+    session_maker: async_sessionmaker,
+) -> ProductRead:
     """
     Обновляет товар по его id.
+    Версии корзин с товаром увеличиваются в фоне (см. touch_carts_changed_since).
     """
     item = await get_product_by_id(product_id, db)
 
+    change_seq = await get_change_seq(db)
     for key, value in data.model_dump(exclude_unset=True).items():
         setattr(item, key, value)
+    await publish(db, "product", id=product_id, name=item.name, is_active=item.is_active)
     await db.commit()
+    background_tasks.add_task(touch_carts_changed_since, change_seq, session_maker)
+    invalidate_product(product_id)
+    suggest_index.update(product_id, item.name, item.is_active)
     await db.refresh(item)
 
     return ProductRead.model_validate(item, from_attributes=True)
 
 
-async def product_read(user: User, product_id: int, db: AsyncSession) -> ProductRead:
+async def product_bulk_update(
+    data: ProductBulkPatch,
+    db: AsyncSession,
+    background_tasks: BackgroundTasks,
+    session_maker: async_sessionmaker,
+) -> ProductBulkResult:
+    """
+    Обновляет несколько товаров одним запросом: одинаково (ids и patch) или
+    каждый товар по отдельности (items). Возвращает id обновленных и ненайденных товаров.
+    Версии корзин с товарами увеличиваются в фоне (см. touch_carts_changed_since).
+
+    Кеши сбрасываются один раз на весь запрос, другие воркеры сбрасывают их целиком.
+    """
+    change_seq = await get_change_seq(db)
+    if data.items is None:
+        changes = data.patch.model_dump(exclude_none=True)
+        stmt = (
+            update(Product)
+            .where(Product.id.in_(data.ids))
+            .values(**changes, updated_at=func.now())
+            .returning(Product.id, Product.name, Product.is_active)
+            .execution_options(synchronize_session=False)
+        )
+        response = await db.execute(stmt)
+        rows = response.all()
+        product_ids = list(dict.fromkeys(data.ids))
+    else:
+        # При повторе id изменения объединяются, последние значения полей побеждают
+        items = {}
+        for item in data.items:
+            items.setdefault(item.id, {}).update(item.model_dump(exclude={"id"}, exclude_none=True))
+        product_ids = list(items)
+        fields = ("name", "price", "is_active")
+        patch_values = {"updated_at": func.now()}
+        rows_data = [{"id": product_id, **dict.fromkeys(fields), **item} for product_id, item in items.items()]
+
+        if db.bind.dialect.name == "postgresql":
+            # Массивы по столбцам (unnest) вместо VALUES: число параметров запроса не зависит
+            # от количества товаров (asyncpg принимает не больше 32767 параметров)
+            types = {"id": Integer, "name": String, "price": Integer, "is_active": Boolean}
+            arrays = [cast([row[key] for row in rows_data], ARRAY(type_)) for key, type_ in types.items()]
+            patches = (
+                func.unnest(*arrays)
+                .table_valued(*(column(key, type_) for key, type_ in types.items()))
+                .render_derived("patches")
+            )
+            stmt = (
+                update(Product)
+                .where(Product.id == patches.c.id)
+                .values(
+                    {key: func.coalesce(patches.c[key], getattr(Product, key)) for key in fields} | patch_values,
+                )
+                .returning(Product.id, Product.name, Product.is_active)
+                .execution_options(synchronize_session=False)
+            )
+            response = await db.execute(stmt)
+            rows = response.all()
+        else:
+            # В SQLite нет массивов: один UPDATE выполняется для каждого товара (executemany).
+            # Запрос к таблице, а не к модели: иначе ORM ожидает в строках первичный ключ
+            stmt = (
+                update(Product.__table__)
+                .where(Product.id == bindparam("patch_id"))
+                .values(
+                    {key: func.coalesce(bindparam(f"patch_{key}"), getattr(Product, key)) for key in fields}
+                    | patch_values,
+                )
+                .execution_options(synchronize_session=False)
+            )
+            await db.execute(stmt, [{f"patch_{key}": value for key, value in row.items()} for row in rows_data])
+            response = await db.execute(
+                select(Product.id, Product.name, Product.is_active).where(Product.id.in_(product_ids))
+            )
+            rows = response.all()
+
+    updated = {row.id for row in rows}
+    await publish(db, "product")
+    await db.commit()
+    if updated:
+        background_tasks.add_task(touch_carts_changed_since, change_seq, session_maker)
+
+    catalog_cache.clear()
+    product_cache.clear()
+    suggest_index.update_many(rows)
+
+    return ProductBulkResult(
+        updated=[product_id for product_id in product_ids if product_id in updated],
+        not_found=[product_id for product_id in product_ids if product_id not in updated],
+    )
+
+
+async def product_read(user: Principal, product_id: int, db: AsyncSession) -> ProductRead:
     """
     Возвращает товар по его id.
     """
-    item = await get_product_by_id(product_id, db, user)
+    item = await get_cached_product(product_id, db)
+    check_product_access(item, user)
 
-    return ProductRead.model_validate(item, from_attributes=True)
+    return item
+
+
+async def product_read_many(user: Principal, product_ids: List[int], db: AsyncSession) -> List[ProductBatchItem]:
+    """
+    Возвращает товары по списку id в порядке списка.
+    Для недоступных товаров вместо товара возвращается код и описание ошибки (см. product_read).
+    """
+    items = await get_cached_products(product_ids, db)
+
+    result = []
+    for product_id in product_ids:
+        item = items[product_id]
+        try:
+            check_product_access(item, user)
+        except HTTPException as e:
+            result.append(ProductBatchItem(id=product_id, status_code=e.status_code, detail=e.detail))
+        else:
+            result.append(ProductBatchItem(id=product_id, status_code=200, product=item))
+
+    return result
 
 
-async def product_list(user: User, db: AsyncSession) -> List[ProductRead]:
+async def product_list(
+    user: Principal,
+    db: AsyncSession,
+    params: ProductListQuery,
+) -> Tuple[List[ProductRead], Optional[str]]:
     """
-    Возвращает список активных товаров.
+    Возвращает страницу списка активных товаров и курсор следующей страницы.
     Если пользователь админ, возвращает все товары.
+
+    Товары упорядочены от новых к старым (newest), по наименованию (name) или по цене (price)
+    и могут быть отфильтрованы по цене и дате изменения.
+    Страница начинается после позиции из курсора (или товара after_id при sort=newest),
+    поэтому выборка по индексу не зависит от глубины пагинации.
+    Если следующей страницы нет, курсор равен None.
     """
-    query = select(Product).order_by(Product.id.desc())
+    keys = PRODUCT_SORT_KEYS[params.sort]
+    columns = [getattr(Product, key) for key in keys]
+
+    query = select(Product).limit(params.limit + 1)
+    if params.sort == "newest":
+        query = query.order_by(Product.id.desc())
+    else:
+        query = query.order_by(*columns)
 
     if (user and not user.is_admin) or not user:
         query = query.where(Product.is_active)
+    if params.min_price is not None:
+        query = query.where(Product.price >= params.min_price)
+    if params.max_price is not None:
+        query = query.where(Product.price <= params.max_price)
+    if params.updated_since is not None:
+        query = query.where(Product.updated_at >= params.updated_since)
+
+    if params.cursor is not None:
+        after = decode_cursor(params.cursor, **keys)
+        if params.sort == "newest":
+            query = query.where(Product.id < after["id"])
+        else:
+            query = query.where(tuple_(*columns) > tuple_(*[after[key] for key in keys]))
+    elif params.after_id is not None and params.sort == "newest":
+        query = query.where(Product.id < params.after_id)
 
     response = await db.execute(query)
     items = response.scalars().all()
+
+    next_cursor = None
+    if len(items) > params.limit:
+        items = items[: params.limit]
+        next_cursor = encode_cursor({key: getattr(items[-1], key) for key in keys})
     result = [ProductRead.model_validate(el, from_attributes=True) for el in items]
 
-    return result
+    return result, next_cursor
+
+
+async def product_list_page(user: Principal, db: AsyncSession, params: ProductListQuery) -> CatalogPage:
+    """
+    Возвращает страницу списка товаров (см. product_list) в виде готового JSON.
+    Страницы кешируются вместе со сжатой gzip версией до изменения любого товара.
+    """
+    key = (bool(user and user.is_admin), *params.model_dump().values())
+    page = catalog_cache.get(key)
+    if page is MISSING:
+        generation = catalog_cache.generation
+        items, next_cursor = await product_list(user, db, params)
+        body = product_list_adapter.dump_json(items)
+        gzip_body = gzip.compress(body) if len(body) >= settings.cache.catalog_gzip_min_size else None
+        page = CatalogPage(body, gzip_body, next_cursor)
+        if may_cache(catalog_cache, db):
+            catalog_cache.set(key, page, generation)
+
+    return page
+
+
+async def product_search(
+    user: Principal,
+    db: AsyncSession,
+    q: str,
+    limit: int,
+    cursor: Optional[str] = None,
+) -> Tuple[List[ProductRead], Optional[str]]:
+    """
+    Ищет товары по наименованию и возвращает страницу результатов и курсор следующей страницы.
+    Неактивные товары видит только админ.
+
+    В Postgres используются полнотекстовый поиск и поиск по триграммам (pg_trgm),
+    результаты упорядочены по релевантности. В остальных БД (SQLite в тестах)
+    ищется вхождение подстроки, результаты упорядочены от новых к старым.
+    """
+    if db.bind.dialect.name == "postgresql":
+        query_tsv = func.plainto_tsquery(literal_column("'simple'::regconfig"), q)
+        rank = func.greatest(func.ts_rank(PRODUCT_NAME_TSVECTOR, query_tsv), func.similarity(Product.name, q))
+        condition = or_(PRODUCT_NAME_TSVECTOR.op("@@")(query_tsv), Product.name.op("%")(q))
+    else:
+        rank = literal(0.0)
+        condition = Product.name.icontains(q, autoescape=True)
+
+    query = select(Product, rank.label("rank")).where(condition).order_by(rank.desc(), Product.id.desc())
+    if (user and not user.is_admin) or not user:
+        query = query.where(Product.is_active)
+    if cursor is not None:
+        after = decode_cursor(cursor, rank=float, id=int)
+        query = query.where(or_(rank < after["rank"], and_(rank == after["rank"], Product.id < after["id"])))
+
+    response = await db.execute(query.limit(limit + 1))
+    rows = response.all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor({"rank": rows[-1].rank, "id": rows[-1].Product.id})
+    result = [ProductRead.model_validate(row.Product, from_attributes=True) for row in rows]
+
+    return result, next_cursor
+
+
+async def product_suggest(db: AsyncSession, prefix: str, limit: int) -> List[dict]:
+    """
+    Возвращает подсказки (id и наименование активных товаров) по началу наименования.
+    Подсказки берутся из индекса в памяти процесса, БД используется только для его построения.
+    """
+    await suggest_index.ensure_built(db)
+    return suggest_index.suggest(prefix, limit)
+
+
+async def product_export(session_maker: async_sessionmaker, compress: bool = False) -> AsyncIterator[bytes]:
+    """
+    Выгружает все товары в формате NDJSON (один товар JSON в строке), по возрастанию id.
+
+    Товары читаются частями по settings.batch.product_export_chunk_size с пагинацией по id,
+    для каждой части открывается короткая сессия: соединение не удерживается, пока клиент
+    принимает данные, а память не зависит от размера каталога.
+    Если compress, поток сжимается gzip.
+    """
+    chunk_size = settings.batch.product_export_chunk_size
+    compressor = zlib.compressobj(wbits=31) if compress else None
+    columns = [Product.id, Product.name, Product.price, Product.is_active, Product.created_at, Product.updated_at]
+    last_id = None
+
+    while True:
+        query = select(*columns).order_by(Product.id).limit(chunk_size)
+        if last_id is not None:
+            query = query.where(Product.id > last_id)
+        async with session_maker() as db:
+            response = await db.execute(query)
+            rows = response.all()
+        if not rows:
+            break
+
+        last_id = rows[-1].id
+        chunk = "".join(ProductRead.model_validate(row, from_attributes=True).model_dump_json() + "\n" for row in rows)
+        chunk = chunk.encode()
+        yield compressor.compress(chunk) if compressor else chunk
+        if len(rows) < chunk_size:
+            break
+
+    if compressor:
+        yield compressor.flush()
+
+
+async def product_changes(db: AsyncSession, since: Optional[str], limit: int) -> ProductChanges:
+    """
+    Возвращает изменения товаров (созданные, измененные и удаленные товары) после позиции
+    курсора since в порядке номера изменения, курсор для продолжения и признак наличия
+    следующих изменений. Без since лента начинается с самого начала.
+
+    Отдаются только изменения с номером меньше change_watermark(): транзакция, начатая
+    раньше, но зафиксированная позже, не может оказаться позади курсора.
+    """
+    after = decode_cursor(since, seq=int, id=int) if since is not None else None
+    watermark = change_watermark()
+
+    def changed(change_seq, changed_at, product_id, deleted: bool):
+        query = select(
+            change_seq.label("seq"),
+            changed_at.label("changed_at"),
+            product_id.label("id"),
+            literal(deleted).label("deleted"),
+        )
+        query = query.where(change_seq < watermark)
+        if after is not None:
+            query = query.where(tuple_(change_seq, product_id) > tuple_(after["seq"], after["id"]))
+        return select(query.order_by(change_seq, product_id).limit(limit + 1).subquery())
+
+    changes = union_all(
+        changed(Product.change_seq, Product.updated_at, Product.id, False),
+        changed(ProductTombstone.change_seq, ProductTombstone.deleted_at, ProductTombstone.product_id, True),
+    ).subquery()
+    response = await db.execute(select(changes).order_by(changes.c.seq, changes.c.id).limit(limit + 1))
+    rows = response.all()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    ids = [row.id for row in rows if not row.deleted]
+    products = {}
+    if ids:
+        response = await db.execute(select(Product).where(Product.id.in_(ids)))
+        products = {item.id: ProductRead.model_validate(item, from_attributes=True) for item in response.scalars()}
+
+    result = []
+    for row in rows:
+        # Товар удален после выборки изменений: его отметка об удалении будет в следующих изменениях
+        if not row.deleted and row.id not in products:
+            continue
+        product = products.get(row.id)
+        result.append(ProductChange(id=row.id, deleted=row.deleted, changed_at=row.changed_at, product=product))
+
+    cursor = encode_cursor({"seq": rows[-1].seq, "id": rows[-1].id}) if rows else since
+    return ProductChanges(changes=result, cursor=cursor, has_more=has_more)
+
+
+# Удаления товаров, продолженные этим воркером после остановки других воркеров
+deletion_tasks: Set[asyncio.Task] = set()
+deletion_counts = {"started": 0, "resumed": 0, "done": 0, "failed": 0}
+
+
+def deletion_stats() -> dict:
+    return {**deletion_counts, "running_resumed": len(deletion_tasks)}
+
+
+register_metrics("product_deletions", deletion_stats)
+
+
+def finish_deletion(product_id: int, status: str):
+    """
+    Запрос, отмечающий завершение удаления товара.
+    """
+    now = datetime.now(timezone.utc)
+    return (
+        update(ProductDeletion)
+        .where(ProductDeletion.product_id == product_id)
+        .values(status=status, updated_at=now, finished_at=now)
+        .execution_options(synchronize_session=False)
+    )
+
+
+async def delete_product_batches(product_id: int, session_maker: async_sessionmaker):
+    """
+    Удаляет товар из корзин частями по settings.batch.product_delete_batch_size строк
+    (каждая часть - отдельная короткая транзакция), затем удаляет сам товар.
+    Ход удаления сохраняется в product_deletions в транзакции каждой части, поэтому
+    удаление, прерванное остановкой воркера, может продолжить другой воркер.
+    """
+    batch_size = settings.batch.product_delete_batch_size
+    try:
+        while True:
+            async with session_maker() as db:
+                batch = select(CartProduct.cart_id).where(CartProduct.product_id == product_id).limit(batch_size)
+                stmt = (
+                    delete(CartProduct)
+                    .where(CartProduct.product_id == product_id, CartProduct.cart_id.in_(batch))
+                    .returning(CartProduct.cart_id)
+                    .execution_options(synchronize_session=False)
+                )
+                response = await db.execute(stmt)
+                cart_ids = response.scalars().all()
+                if cart_ids:
+                    stmt = (
+                        update(Cart)
+                        .where(Cart.id.in_(cart_ids))
+                        .values(version=Cart.version + 1)
+                        .execution_options(synchronize_session=False)
+                    )
+                    await db.execute(stmt)
+                stmt = (
+                    update(ProductDeletion)
+                    .where(ProductDeletion.product_id == product_id)
+                    .values(
+                        deleted_cart_items=ProductDeletion.deleted_cart_items + len(cart_ids),
+                        updated_at=datetime.now(timezone.utc),
+                    )
+                    .execution_options(synchronize_session=False)
+                )
+                await db.execute(stmt)
+                await db.commit()
+            if len(cart_ids) < batch_size:
+                break
+
+        async with session_maker() as db:
+            await db.execute(delete(Product).where(Product.id == product_id))
+            insert = get_insert(db)(ProductTombstone).values(product_id=product_id)
+            insert = insert.on_conflict_do_update(
+                index_elements=[ProductTombstone.product_id],
+                set_={"deleted_at": func.now(), "change_seq": current_change_seq()},
+            )
+            await db.execute(insert)
+            await db.execute(finish_deletion(product_id, "done"))
+            await publish(db, "product", id=product_id, deleted=True)
+            await db.commit()
+    except Exception:
+        deletion_counts["failed"] += 1
+        logger.exception("Ошибка удаления товара %s", product_id)
+        try:
+            async with session_maker() as db:
+                await db.execute(finish_deletion(product_id, "failed"))
+                await db.commit()
+        except Exception:
+            # Удаление останется выполняющимся и будет продолжено после settings.batch.product_delete_stale_seconds
+            logger.exception("Не удалось отметить ошибку удаления товара %s", product_id)
+    else:
+        deletion_counts["done"] += 1
+        invalidate_product(product_id)
+        suggest_index.remove(product_id)
 
 
-async def product_delete(product_id: int, db: AsyncSession):
+async def product_delete(
+    product_id: int,
+    db: AsyncSession,
+    background_tasks: BackgroundTasks,
+    session_maker: async_sessionmaker,
+):
     """
     Удаляет товар по его id.
     Если товар не существует, возвращает ошибку 404.
+
+    Товар сразу становится неактивным, а удаление из корзин и из БД выполняется
+    в фоне частями (см. delete_product_batches), чтобы не блокировать корзины
+    одной долгой транзакцией. Повторный запрос возобновляет прерванное удаление.
     """
-    stmt = delete(Product).where(Product.id == product_id)
+    stmt = (
+        update(Product)
+        .where(Product.id == product_id)
+        .values(is_active=False)
+        .returning(Product.name)
+        .execution_options(synchronize_session=False)
+    )
     response = await db.execute(stmt)
-    deleted_count = response.rowcount
-    if deleted_count == 0:
+    name = response.scalar()
+    if name is None:
         raise HTTPException(status_code=404, detail="Товар не найден")
 
+    # Удаление запускается заново, если оно завершено или брошено остановленным воркером.
+    # Брошенное удаление продолжается с сохранением хода.
+    now = datetime.now(timezone.utc)
+    stale = now - timedelta(seconds=settings.batch.product_delete_stale_seconds)
+    running = ProductDeletion.status == "running"
+    insert = get_insert(db)(ProductDeletion).values(
+        product_id=product_id, status="running", deleted_cart_items=0, started_at=now, updated_at=now
+    )
+    insert = insert.on_conflict_do_update(
+        index_elements=[ProductDeletion.product_id],
+        set_={
+            "status": "running",
+            "deleted_cart_items": case((running, ProductDeletion.deleted_cart_items), else_=0),
+            "started_at": case((running, ProductDeletion.started_at), else_=now),
+            "updated_at": now,
+            "finished_at": None,
+        },
+        where=or_(~running, ProductDeletion.updated_at < stale),
+    ).returning(ProductDeletion.product_id)
+    started = (await db.execute(insert)).scalar() is not None
+
+    await publish(db, "product", id=product_id, name=name, is_active=False)
     await db.commit()
+    invalidate_product(product_id)
+    suggest_index.remove(product_id)
+
+    if started:
+        deletion_counts["started"] += 1
+        background_tasks.add_task(delete_product_batches, product_id, session_maker)
+
     return JSONResponse(status_code=200, content={"message": "Товар успешно удалён"})
+
+
+async def resume_product_deletions(session_maker: async_sessionmaker) -> List[int]:
+    """
+    Забирает удаления товаров, брошенные остановленными воркерами (без продвижения дольше
+    settings.batch.product_delete_stale_seconds), и продолжает их в фоне.
+    Возвращает id товаров, удаление которых продолжено.
+    """
+    now = datetime.now(timezone.utc)
+    stale = now - timedelta(seconds=settings.batch.product_delete_stale_seconds)
+    async with session_maker() as db:
+        # Удаление забирает только один воркер: после обновления оно перестает быть брошенным
+        stmt = (
+            update(ProductDeletion)
+            .where(ProductDeletion.status == "running", ProductDeletion.updated_at < stale)
+            .values(updated_at=now)
+            .returning(ProductDeletion.product_id)
+            .execution_options(synchronize_session=False)
+        )
+        response = await db.execute(stmt)
+        product_ids = response.scalars().all()
+        await db.commit()
+
+    for product_id in product_ids:
+        logger.warning("Продолжается прерванное удаление товара %s", product_id)
+        deletion_counts["resumed"] += 1
+        task = asyncio.create_task(delete_product_batches(product_id, session_maker))
+        deletion_tasks.add(task)
+        task.add_done_callback(deletion_tasks.discard)
+    return product_ids
+
+
+async def watch_product_deletions(session_maker: async_sessionmaker):
+    """
+    Продолжает брошенные удаления товаров при запуске воркера и затем периодически.
+    """
+    while True:
+        try:
+            await resume_product_deletions(session_maker)
+        except (OSError, SQLAlchemyError):
+            logger.warning("Не удалось проверить прерванные удаления товаров")
+        await asyncio.sleep(settings.batch.product_delete_stale_seconds)
+
+
+async def get_product_deletion(product_id: int, db: AsyncSession) -> ProductDeletion:
+    """
+    Возвращает ход удаления товара.
+    """
+    deletion = await db.get(ProductDeletion, product_id)
+    if deletion is None:
+        raise HTTPException(status_code=404, detail="Удаление товара не найдено")
+    return deletion
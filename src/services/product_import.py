@@ -0,0 +1,243 @@
+import codecs
+import csv
+import json
+from typing import AsyncIterable, AsyncIterator, List, Literal, Optional, Tuple
+
+from pydantic import ValidationError
+from sqlalchemy import bindparam, func, text, update
+from fastapi import BackgroundTasks
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from config.db import get_insert
+from config.settings import settings
+from models.product import Product
+from schemas.product import ProductImportError, ProductImportResult, ProductImportRow
+from services.events import dispatch, publish
+from services.product import get_change_seq, touch_carts_changed_since
+
+# Сколько ошибок валидации возвращается в ответе (остальные только подсчитываются)
+MAX_REPORTED_ERRORS = 100
+
+IMPORT_COLUMNS = ("n", "id", "name", "price", "is_active")
+
+STAGING_TABLE = "product_import"
+
+
+async def iter_lines(chunks: AsyncIterable[bytes]) -> AsyncIterator[str]:
+    """
+    Разбивает поток байтов (UTF-8) на строки, не накапливая его в памяти.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    tail = ""
+    async for chunk in chunks:
+        lines = (tail + decoder.decode(chunk)).split("\n")
+        tail = lines.pop()
+        for line in lines:
+            yield line.rstrip("\r")
+    tail += decoder.decode(b"", final=True)
+    if tail:
+        yield tail.rstrip("\r")
+
+
+async def iter_records(
+    chunks: AsyncIterable[bytes],
+    format: Literal["csv", "ndjson"],
+) -> AsyncIterator[Tuple[int, Optional[dict], Optional[str]]]:
+    """
+    Возвращает записи файла импорта: (номер строки, данные, ошибка разбора).
+    CSV должен начинаться со строки заголовка с именами полей.
+    """
+    header = None
+    pending = ""
+    line_number = 0
+    async for line in iter_lines(chunks):
+        line_number += 1
+        if format == "ndjson":
+            if not line.strip():
+                continue
+            try:
+                data = json.loads(line)
+            except ValueError:
+                yield line_number, None, "Некорректный JSON"
+                continue
+            if not isinstance(data, dict):
+                yield line_number, None, "Ожидается JSON объект"
+                continue
+            yield line_number, data, None
+            continue
+
+        # Значение в кавычках может содержать перевод строки
+        pending = f"{pending}\n{line}" if pending else line
+        if pending.count('"') % 2:
+            continue
+        line, pending = pending, ""
+        if not line.strip():
+            continue
+
+        values = next(csv.reader([line]))
+        if header is None:
+            header = [value.strip() for value in values]
+            continue
+        if len(values) != len(header):
+            yield line_number, None, "Количество значений не совпадает с заголовком"
+            continue
+        # Пустые значения необязательных полей считаются незаполненными
+        yield line_number, {key: value for key, value in zip(header, values) if value != ""}, None
+
+    if pending:
+        yield line_number, None, "Незакрытые кавычки"
+
+
+async def create_staging_table(db: AsyncSession):
+    await db.execute(
+        text(
+            f"CREATE TEMP TABLE {STAGING_TABLE} "
+            "(n bigint, id integer, name varchar, price integer, is_active boolean) ON COMMIT DROP"
+        )
+    )
+
+
+async def copy_chunk(db: AsyncSession, rows: List[tuple]):
+    """
+    Загружает часть строк в промежуточную таблицу через COPY (Postgres).
+    """
+    connection = await db.connection()
+    raw_connection = await connection.get_raw_connection()
+    await raw_connection.driver_connection.copy_records_to_table(STAGING_TABLE, records=rows, columns=IMPORT_COLUMNS)
+
+
+async def merge_staging_table(db: AsyncSession) -> int:
+    """
+    Переносит товары из промежуточной таблицы в products (Postgres).
+    Товары с id обновляются или создаются (при повторе id в файле побеждает последняя строка),
+    товары без id создаются.
+    """
+    # Пустой is_active не меняет активность существующего товара, новые товары по умолчанию активны
+    updated = await db.execute(
+        text(
+            "UPDATE products SET name = s.name, price = s.price, "
+            "is_active = coalesce(s.is_active, products.is_active), updated_at = now(), "
+            "change_seq = pg_current_xact_id()::text::bigint "
+            "FROM (SELECT DISTINCT ON (id) id, name, price, is_active "
+            f"FROM {STAGING_TABLE} WHERE id IS NOT NULL ORDER BY id, n DESC) AS s "
+            "WHERE products.id = s.id"
+        )
+    )
+    upserted = await db.execute(
+        text(
+            "INSERT INTO products (id, name, price, is_active) "
+            "SELECT DISTINCT ON (id) id, name, price, coalesce(is_active, true) "
+            f"FROM {STAGING_TABLE} WHERE id IS NOT NULL ORDER BY id, n DESC "
+            "ON CONFLICT (id) DO NOTHING"
+        )
+    )
+    inserted = await db.execute(
+        text(
+            "INSERT INTO products (name, price, is_active) "
+            f"SELECT name, price, coalesce(is_active, true) FROM {STAGING_TABLE} WHERE id IS NULL ORDER BY n"
+        )
+    )
+    # Явные id не двигают последовательность, следующий товар без id не должен с ними совпасть
+    await db.execute(
+        text(
+            "SELECT setval(pg_get_serial_sequence('products', 'id'), "
+            "(SELECT coalesce(max(id), 0) + 1 FROM products), false)"
+        )
+    )
+    return updated.rowcount + upserted.rowcount + inserted.rowcount
+
+
+async def insert_chunk(db: AsyncSession, rows: List[tuple]) -> int:
+    """
+    Загружает часть строк напрямую в products (все диалекты, кроме Postgres).
+    """
+    keyed = {}
+    new = []
+    for _, product_id, name, price, is_active in rows:
+        if product_id is None:
+            new.append({"name": name, "price": price, "is_active": is_active is not False})
+        else:
+            keyed[product_id] = {"id": product_id, "name": name, "price": price, "is_active": is_active}
+
+    if keyed:
+        # Пустой is_active не меняет активность существующего товара, новые товары по умолчанию активны.
+        # Запрос к таблице, а не к модели: иначе ORM ожидает в строках первичный ключ
+        stmt = (
+            update(Product.__table__)
+            .where(Product.id == bindparam("row_id"))
+            .values(
+                name=bindparam("row_name"),
+                price=bindparam("row_price"),
+                is_active=func.coalesce(bindparam("row_is_active"), Product.is_active),
+                updated_at=func.now(),
+            )
+            .execution_options(synchronize_session=False)
+        )
+        await db.execute(stmt, [{f"row_{key}": value for key, value in values.items()} for values in keyed.values()])
+        stmt = get_insert(db)(Product).on_conflict_do_nothing(index_elements=[Product.id])
+        await db.execute(stmt, [values | {"is_active": values["is_active"] is not False} for values in keyed.values()])
+    if new:
+        await db.execute(get_insert(db)(Product), new)
+
+    return len(keyed) + len(new)
+
+
+async def import_products(
+    chunks: AsyncIterable[bytes],
+    format: Literal["csv", "ndjson"],
+    db: AsyncSession,
+    background_tasks: BackgroundTasks,
+    session_maker: async_sessionmaker,
+) -> ProductImportResult:
+    """
+    Импортирует товары из потока CSV или NDJSON одной транзакцией.
+    Версии корзин с измененными товарами увеличиваются в фоне (см. touch_carts_changed_since).
+
+    Строки проверяются схемой ProductImportRow и загружаются частями по
+    settings.batch.product_import_chunk_size строк, поэтому память не зависит от размера файла.
+    Некорректные строки пропускаются и возвращаются в списке ошибок.
+    """
+    is_postgres = db.bind.dialect.name == "postgresql"
+    chunk_size = settings.batch.product_import_chunk_size
+    result = ProductImportResult()
+    rows = []
+
+    async def flush():
+        if is_postgres:
+            await copy_chunk(db, rows)
+        else:
+            result.imported += await insert_chunk(db, rows)
+        rows.clear()
+
+    change_seq = await get_change_seq(db)
+    if is_postgres:
+        await create_staging_table(db)
+
+    async for line_number, data, error in iter_records(chunks, format):
+        if data is not None:
+            try:
+                row = ProductImportRow.model_validate(data)
+            except ValidationError as e:
+                error = "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors())
+        if error is not None:
+            result.rejected += 1
+            if len(result.errors) < MAX_REPORTED_ERRORS:
+                result.errors.append(ProductImportError(line=line_number, detail=error))
+            continue
+
+        rows.append((line_number, row.id, row.name, row.price, row.is_active))
+        if len(rows) >= chunk_size:
+            await flush()
+
+    if rows:
+        await flush()
+    if is_postgres:
+        result.imported = await merge_staging_table(db)
+
+    await publish(db, "product")
+    await db.commit()
+    background_tasks.add_task(touch_carts_changed_since, change_seq, session_maker)
+    # Изменено произвольное количество товаров: кеши и индекс подсказок сбрасываются целиком
+    dispatch({"entity": "product"})
+
+    return result
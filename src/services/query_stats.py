@@ -0,0 +1,117 @@
+import logging
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from config.settings import settings
+from services.metrics import register_metrics
+
+logger = logging.getLogger(__name__)
+
+
+class QueryStats:
+    """
+    Запросы к БД, выполненные в рамках запроса к API (или другого отслеживаемого участка кода).
+    """
+
+    __slots__ = ("statements", "rows", "seconds", "counts")
+
+    def __init__(self):
+        self.statements = 0
+        self.rows = 0
+        self.seconds = 0.0
+        # Сколько раз выполнялся каждый текст запроса
+        self.counts: Counter = Counter()
+
+    def add(self, statement: str, seconds: float, rows: int):
+        self.statements += 1
+        self.rows += rows
+        self.seconds += seconds
+        self.counts[statement] += 1
+
+    @property
+    def repeated(self) -> int:
+        """
+        Наибольшее число выполнений одного и того же запроса (признак N+1).
+        """
+        return max(self.counts.values(), default=0)
+
+
+# Отслеживаемые в текущем контексте участки (вложенные участки учитывают запросы вместе)
+active_stats: ContextVar[Tuple[QueryStats, ...]] = ContextVar("active_stats", default=())
+
+
+@contextmanager
+def track_queries() -> Iterator[QueryStats]:
+    """
+    Считает запросы к БД, выполненные внутри блока with.
+    """
+    stats = QueryStats()
+    token = active_stats.set(active_stats.get() + (stats,))
+    try:
+        yield stats
+    finally:
+        active_stats.reset(token)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    seconds = time.perf_counter() - conn.info["query_started"].pop()
+    # Для SELECT драйвер может не сообщать количество строк (-1)
+    rows = max(cursor.rowcount or 0, 0)
+    for stats in active_stats.get():
+        stats.add(statement, seconds, rows)
+
+
+@event.listens_for(Engine, "handle_error")
+def handle_error(context):
+    started = context.connection.info.get("query_started") if context.connection is not None else None
+    if started:
+        started.pop()
+
+
+# Сводка по маршрутам API ("GET /product/{product_id}")
+routes: Dict[str, Dict[str, float]] = {}
+
+
+def record_request(route: str, stats: QueryStats):
+    """
+    Добавляет запросы к БД, выполненные при обработке запроса к API, в сводку по маршруту.
+    """
+    summary = routes.get(route)
+    if summary is None:
+        summary = routes[route] = {
+            "requests": 0,
+            "statements": 0,
+            "rows": 0,
+            "seconds": 0.0,
+            "max_statements": 0,
+            "n_plus_one": 0,
+        }
+    summary["requests"] += 1
+    summary["statements"] += stats.statements
+    summary["rows"] += stats.rows
+    summary["seconds"] += stats.seconds
+    summary["max_statements"] = max(summary["max_statements"], stats.statements)
+
+    if stats.repeated >= settings.db.n_plus_one_threshold:
+        summary["n_plus_one"] += 1
+        statement, count = stats.counts.most_common(1)[0]
+        logger.warning("%s: запрос выполнен %s раз (N+1?): %s", route, count, statement)
+
+
+def sql_metrics() -> dict:
+    return {route: {**summary, "seconds": round(summary["seconds"], 6)} for route, summary in sorted(routes.items())}
+
+
+register_metrics("sql", sql_metrics)
@@ -0,0 +1,138 @@
+import asyncio
+from bisect import bisect_left, insort
+from typing import Dict, List, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config.settings import settings
+from models.product import Product
+from services.events import subscribe
+from services.metrics import register_metrics
+
+
+class SuggestIndex:
+    """
+    Отсортированный индекс наименований активных товаров для подсказок по префиксу.
+    Хранит не больше max_entries товаров, ключи поиска обрезаются до max_key_length символов.
+    """
+
+    def __init__(self, max_entries: int, max_key_length: int):
+        self.max_entries = max_entries
+        self.max_key_length = max_key_length
+        # Пары (ключ поиска, id товара) в порядке сортировки
+        self.keys: List[Tuple[str, int]] = []
+        # Наименования товаров по id
+        self.names: Dict[int, str] = {}
+
+        self.built = False
+        self.generation = 0
+        self.lock = asyncio.Lock()
+        self.dropped = 0
+
+    def make_key(self, name: str) -> str:
+        return name.casefold()[: self.max_key_length]
+
+    async def build(self, db: AsyncSession):
+        """
+        Строит индекс по активным товарам (при переполнении - по самым новым).
+        """
+        generation = self.generation
+        query = select(Product.id, Product.name).where(Product.is_active).order_by(Product.id.desc())
+        response = await db.execute(query.limit(self.max_entries))
+        rows = response.all()
+
+        self.names = {row.id: row.name for row in rows}
+        self.keys = sorted((self.make_key(row.name), row.id) for row in rows)
+        # Если товары менялись во время построения, индекс перестроится при следующем запросе
+        self.built = generation == self.generation
+
+    async def ensure_built(self, db: AsyncSession):
+        if self.built:
+            return
+        async with self.lock:
+            if not self.built:
+                await self.build(db)
+
+    def remove(self, product_id: int):
+        self.generation += 1
+        name = self.names.pop(product_id, None)
+        if name is None:
+            return
+        entry = (self.make_key(name), product_id)
+        index = bisect_left(self.keys, entry)
+        if index < len(self.keys) and self.keys[index] == entry:
+            del self.keys[index]
+
+    def update(self, product_id: int, name: str, is_active: bool):
+        """
+        Добавляет, обновляет или удаляет (если товар неактивен) товар в индексе.
+        """
+        self.remove(product_id)
+        if not is_active:
+            return
+        if len(self.names) >= self.max_entries:
+            self.dropped += 1
+            return
+        self.names[product_id] = name
+        insort(self.keys, (self.make_key(name), product_id))
+
+    def update_many(self, rows):
+        """
+        Применяет изменения нескольких товаров (строки с id, name, is_active) с одной пересортировкой ключей.
+        """
+        self.generation += 1
+        for row in rows:
+            self.names.pop(row.id, None)
+        for row in rows:
+            if not row.is_active:
+                continue
+            if len(self.names) >= self.max_entries:
+                self.dropped += 1
+                continue
+            self.names[row.id] = row.name
+        self.keys = sorted((self.make_key(name), product_id) for product_id, name in self.names.items())
+
+    def suggest(self, prefix: str, limit: int) -> List[dict]:
+        """
+        Возвращает товары, наименование которых начинается с prefix, в алфавитном порядке.
+        """
+        full_prefix = prefix.casefold()
+        prefix = self.make_key(prefix)
+        result = []
+        index = bisect_left(self.keys, (prefix, 0))
+        while index < len(self.keys) and len(result) < limit:
+            key, product_id = self.keys[index]
+            if not key.startswith(prefix):
+                break
+            name = self.names[product_id]
+            # Ключи обрезаны, длинный префикс сверяется с полным наименованием
+            if len(full_prefix) <= self.max_key_length or name.casefold().startswith(full_prefix):
+                result.append({"id": product_id, "name": name})
+            index += 1
+        return result
+
+    def on_product_event(self, event: dict):
+        """
+        Применяет изменение товара, сделанное другим воркером.
+        """
+        if event.get("id") is None:
+            self.generation += 1
+            self.built = False
+        elif event.get("deleted"):
+            self.remove(event["id"])
+        elif "name" in event:
+            self.update(event["id"], event["name"], event["is_active"])
+
+    def stats(self) -> dict:
+        return {
+            "built": self.built,
+            "size": len(self.names),
+            "max_entries": self.max_entries,
+            "dropped": self.dropped,
+        }
+
+
+suggest_index = SuggestIndex(settings.cache.suggest_max_entries, settings.cache.suggest_max_key_length)
+subscribe("product", suggest_index.on_product_event)
+register_metrics("suggest_index", suggest_index.stats)
@@ -1,3 +1,4 @@
+import time
 from typing import Optional
 from datetime import datetime, timedelta, timezone
 
@@ -5,16 +6,19 @@ import jwt
 from fastapi import Depends, HTTPException, status, Request
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.security.utils import get_authorization_scheme_param
-from sqlalchemy import or_, select
+from sqlalchemy import func, select
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
-from passlib.context import CryptContext
 
 from config.settings import settings
 from models.users import User
-from schemas.users import CreateUser, UserRead, TokenData, LoginSchema
-from config.db import get_db
+from schemas.users import CreateUser, Principal, UserRead, TokenData, LoginSchema
+from config.db import async_session_maker, get_read_db, is_replica
+from services.cache import MISSING, LRUCache
 from services.cart import create_cart
+from services.events import publish, subscribe
+from services.metrics import register_metrics
+from services.passwords import password_hasher
 
 
 class SecurityBearer(HTTPBearer):
@@ -40,22 +44,42 @@ class SecurityBearer(HTTPBearer):
         return HTTPAuthorizationCredentials(scheme=scheme, credentials=credentials)
 
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 security = SecurityBearer(scheme_name="Token", description="")
 
+# Последние сверенные с БД данные пользователей по их id
+principals = LRUCache(settings.cache.principal_cache_size, settings.jwt.principal_revalidate_seconds)
+register_metrics("principal_cache", principals.stats)
+
+
+def on_user_event(event: dict):
+    """
+    Сбрасывает данные пользователя после его изменения другим воркером.
+    """
+    if event.get("id") is None:
+        principals.clear()
+    else:
+        principals.invalidate(event["id"])
+
+
+subscribe("user", on_user_event)
+
 
 async def create_user(user: CreateUser, db: AsyncSession, is_admin=False):
     """
     Создает пользователя, хеширует пароль, сохраняет в БД и возвращает пользователя.
     """
     user_dump = user.model_dump(exclude=("password1", "password2"))
-    user_dump["password"] = get_password_hash(user.password1)
+    # Email хранится в нижнем регистре: вход по email не зависит от регистра (см. get_user)
+    user_dump["email"] = user_dump["email"].lower()
+    user_dump["password"] = await get_password_hash(user.password1)
     new_user = User(**user_dump)
     if is_admin:
         new_user.is_admin = True
 
     try:
         db.add(new_user)
+        await db.flush()
+        await publish(db, "user", id=new_user.id)
         await db.commit()
     except IntegrityError:
         raise HTTPException(status_code=409, detail="Пользователь с таким email или телефоном уже существует.")
@@ -66,21 +90,23 @@ async def create_user(user: CreateUser, db: AsyncSession, is_admin=False):
     return UserRead.model_validate(new_user)
 
 
-def verify_password(plain_password, password):
-    return pwd_context.verify(plain_password, password)
+async def verify_password(plain_password, password):
+    return await password_hasher.verify(plain_password, password)
 
 
-def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
+async def get_password_hash(password: str) -> str:
+    return await password_hasher.hash(password)
 
 
 async def get_user(db, username: str):
-    query = select(User).where(
-        or_(
-            User.email == username,
-            User.phone == username,
-        )
-    )
+    """
+    Возвращает пользователя по телефону (если username начинается с "+")
+    или по email без учета регистра (по уникальному индексу lower(email)).
+    """
+    if username.startswith("+"):
+        query = select(User).where(User.phone == username)
+    else:
+        query = select(User).where(func.lower(User.email) == username.lower())
 
     result = await db.execute(query)
     user = result.scalars().first()
@@ -90,27 +116,55 @@ async def get_user(db, username: str):
 
 async def authenticate_user(db: AsyncSession, username: str, password: str):
     user = await get_user(db, username)
+    if not user and is_replica(db):
+        # Только что зарегистрированного пользователя может еще не быть в реплике
+        async with async_session_maker() as primary_db:
+            user = await get_user(primary_db, username)
 
     if not user:
         return False
-    if not verify_password(password, user.password):
+    if not await verify_password(password, user.password):
         return False
     return user
 
 
+async def get_principal(db: AsyncSession, user_id: int | None, username: str) -> Principal | None:
+    """
+    Сверяет с БД флаги пользователя из токена.
+    Читает только нужные колонки, без корзины.
+    """
+    query = select(User.id, User.email, User.is_admin, User.is_active)
+    if user_id is not None:
+        query = query.where(User.id == user_id)
+    else:
+        query = query.where(User.email == username)
+
+    result = await db.execute(query)
+    row = result.first()
+    if row is None:
+        return None
+
+    return Principal(row.id, row.email, row.is_admin, row.is_active, time.time())
+
+
+def is_fresh(checked_at: float) -> bool:
+    return time.time() - checked_at < settings.jwt.principal_revalidate_seconds
+
+
 def create_access_token(data: dict, expires_delta: timedelta | None = None):
     to_encode = data.copy()
+    now = datetime.now(timezone.utc)
     if expires_delta:
-        expire = datetime.now(timezone.utc) + expires_delta
+        expire = now + expires_delta
     else:
-        expire = datetime.now(timezone.utc) + timedelta(minutes=15)
-    to_encode.update({"exp": expire})
+        expire = now + timedelta(minutes=15)
+    to_encode.update({"exp": expire, "iat": now})
     encoded_jwt = jwt.encode(to_encode, key=settings.jwt.secret_key, algorithm=settings.jwt.algorithm)
     return encoded_jwt
 
 
 async def get_current_user(
-    credentials: HTTPAuthorizationCredentials = Depends(security), db: AsyncSession = Depends(get_db)
+    credentials: HTTPAuthorizationCredentials = Depends(security), db: AsyncSession = Depends(get_read_db)
 ):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -126,13 +180,24 @@ async def get_current_user(
         token_data = TokenData(username=username)
     except jwt.InvalidTokenError:
         raise credentials_exception
-    user = await get_user(db, username=token_data.username)
-    if user is None:
-        raise credentials_exception
-    return user
+
+    # Флаги из свежевыданного токена или недавно сверенные с БД используются без запроса к БД
+    user_id = payload.get("uid")
+    principal = principals.get(user_id)
+    generation = principals.generation
+    if principal is MISSING or not is_fresh(principal.checked_at):
+        if user_id is not None and is_fresh(payload.get("iat", 0)):
+            principal = Principal.from_claims(payload)
+        else:
+            principal = await get_principal(db, user_id, token_data.username)
+            if principal is None:
+                raise credentials_exception
+        principals.set(principal.id, principal, generation)
+
+    return principal
 
 
-async def get_current_active_user(current_user: User = Depends(get_current_user)):
+async def get_current_active_user(current_user: Principal = Depends(get_current_user)):
     if not current_user.is_active:
         raise HTTPException(status_code=400, detail="Пользователь неактивен")
     return current_user
@@ -148,10 +213,11 @@ async def get_access_token(db: AsyncSession, data: LoginSchema):
         )
     access_token_expires = timedelta(minutes=settings.jwt.access_token_expire_minutes)
 
-    return create_access_token(data={"sub": user.email}, expires_delta=access_token_expires)
+    claims = {"sub": user.email, "uid": user.id, "adm": user.is_admin, "act": user.is_active}
+    return create_access_token(data=claims, expires_delta=access_token_expires)
 
 
-async def is_admin(user: User = Depends(get_current_active_user)):
+async def is_admin(user: Principal = Depends(get_current_active_user)):
     if not user.is_admin:
         raise HTTPException(status_code=403, detail="Access forbidden")
     return True
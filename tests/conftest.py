@@ -1,13 +1,16 @@
+from contextlib import contextmanager
 from typing import AsyncGenerator
+from fastapi import Request
 from fastapi.security import OAuth2PasswordRequestForm
 from fastapi.testclient import TestClient
 from httpx import ASGITransport, AsyncClient
 import pytest
 from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
-from config.db import Base, get_db
+from config.db import Base, RequestSessions, get_session_maker, get_sessions
 from main import app
 from models.product import Product
 from schemas.users import CreateUser
+from services.query_stats import track_queries
 from services.users import create_user, get_access_token
 
 
@@ -19,12 +22,13 @@ async_test_session_maker = async_sessionmaker(
 )
 
 
-async def get_test_db():
-    async with async_test_session_maker() as db:
-        yield db
+async def get_test_sessions(request: Request):
+    async with RequestSessions(request, async_test_session_maker) as sessions:
+        yield sessions
 
 
-app.dependency_overrides[get_db] = get_test_db
+app.dependency_overrides[get_sessions] = get_test_sessions
+app.dependency_overrides[get_session_maker] = lambda: async_test_session_maker
 client = TestClient(app)
 
 
@@ -46,6 +50,21 @@ async def prepare_database():
         await connection.run_sync(Base.metadata.drop_all)
 
 
+@pytest.fixture
+def query_budget():
+    """
+    Проверяет, что код внутри блока with выполняет не больше max_queries запросов к БД.
+    """
+
+    @contextmanager
+    def check(max_queries: int):
+        with track_queries() as stats:
+            yield stats
+        assert stats.statements <= max_queries, f"Выполнено запросов к БД: {stats.statements}, бюджет: {max_queries}"
+
+    return check
+
+
 @pytest.fixture(scope="session")
 async def ac() -> AsyncGenerator[AsyncClient, None]:
     async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as session:
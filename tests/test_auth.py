@@ -1,6 +1,12 @@
 import asyncio
+import jwt
 from httpx import AsyncClient
 import pytest
+from sqlalchemy import func, select, text
+from config.settings import settings
+from conftest import async_test_session_maker
+from models.users import User
+from services.users import principals
 
 
 async def execute_register(ac: AsyncClient, new_user: dict, email: str, phone: str, password1: str, password2: str):
@@ -54,6 +60,13 @@ async def test_registration(ac: AsyncClient):
     response = await execute_register(ac, new_user, email[-1], phone[-1], password[-1], password[-1])
     assert response.status_code == 409
 
+    # Email сохраняется в нижнем регистре и не может повторяться в другом регистре
+    response = await execute_register(ac, new_user, "Case@Test.ru", "+70000000001", password[-1], password[-1])
+    assert response.status_code == 201
+    assert response.json()["email"] == "case@test.ru"
+    response = await execute_register(ac, new_user, "TEST@test.ru", "+70000000002", password[-1], password[-1])
+    assert response.status_code == 409
+
 
 @pytest.mark.asyncio(loop_scope="session")
 async def test_authentication(ac: AsyncClient):
@@ -80,3 +93,38 @@ async def test_authentication(ac: AsyncClient):
         "token_type": "bearer",
         "access_token": responses[-1].json()["access_token"],
     }
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_authentication_email_case(ac: AsyncClient, query_budget):
+    """Вход по email без учета регистра, каждый вход - один запрос пользователя"""
+    for username in ("USER1@User.ru", "+77777777777"):
+        with query_budget(1):
+            response = await ac.post("/users/login", json={"username": username, "password": "Qwerty12345!"})
+        assert response.status_code == 200
+
+    # Поиск по email использует только уникальный индекс lower(email)
+    async with async_test_session_maker() as db:
+        query = select(User).where(func.lower(User.email) == "user1@user.ru")
+        compiled = query.compile(db.bind, compile_kwargs={"literal_binds": True})
+        response = await db.execute(text(f"EXPLAIN QUERY PLAN {compiled}"))
+        plan = " ".join(row[-1] for row in response)
+    assert "USING INDEX ix_users_email_lower" in plan
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_token_claims(user_token, ac: AsyncClient):
+    """Токен содержит данные, достаточные для проверки прав без загрузки пользователя"""
+    payload = jwt.decode(user_token, options={"verify_signature": False})
+    assert payload["sub"] == "user1@user.ru"
+    assert payload["adm"] is False
+    assert payload["act"] is True
+    assert isinstance(payload["uid"], int)
+
+    # Просроченные данные пользователя сверяются с БД
+    principals.clear()
+    payload["iat"] = 0
+    token = jwt.encode(payload, key=settings.jwt.secret_key, algorithm=settings.jwt.algorithm)
+    response = await ac.get("/product/101", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 200
+    assert principals.get(payload["uid"]).email == "user1@user.ru"
@@ -1,6 +1,7 @@
 import asyncio
 from httpx import AsyncClient
 import pytest
+from config.settings import settings
 
 
 @pytest.mark.asyncio(loop_scope="session")
@@ -232,3 +233,127 @@ async def test_clear_cart(user_token, ac: AsyncClient):
         "cart": [],
         "total_cost": 0,
     }
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_cart_total_after_repricing(user_token, admin_token, ac: AsyncClient):
+    """Стоимость корзины пересчитывается после изменения цены товара"""
+    headers = {"Authorization": f"Bearer {user_token}"}
+    admin_headers = {"Authorization": f"Bearer {admin_token}"}
+
+    response = await ac.post("/cart", headers=headers, json={"product_id": 101, "quantity": 2})
+    assert response.json()["total_cost"] == 60
+
+    response = await ac.patch("/product/101", headers=admin_headers, json={"price": 40})
+    assert response.status_code == 200
+    response = await ac.get("/cart", headers=headers)
+    assert response.json()["total_cost"] == 80
+
+    await ac.patch("/product/101", headers=admin_headers, json={"price": 30})
+    response = await ac.delete("/cart", headers=headers)
+    assert response.json()["total_cost"] == 0
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_batch_change_cart(user_token, ac: AsyncClient):
+    """Пакетное изменение корзины с ошибками по отдельным товарам"""
+    headers = {"Authorization": f"Bearer {user_token}"}
+
+    await ac.post("/cart", headers=headers, json={"product_id": 103, "quantity": 5})
+    items = [
+        {"product_id": 101, "quantity": 2},
+        {"product_id": 101},
+        {"product_id": 104, "quantity": 7, "action": "set"},
+        {"product_id": 104, "quantity": 2},
+        {"product_id": 103, "action": "remove"},
+        {"product_id": 102},
+        {"product_id": 1000},
+    ]
+    response = await ac.post("/cart/batch", headers=headers, json=items)
+    assert response.status_code == 200
+    assert response.json() == {
+        "total_cost": 180,
+        "cart": [
+            {
+                "quantity": 3,
+                "product": {"id": 101, "is_active": True, "name": "test1", "price": 30},
+            },
+            {
+                "quantity": 9,
+                "product": {"id": 104, "is_active": True, "name": "test4", "price": 10},
+            },
+        ],
+        "errors": [
+            {"product_id": 102, "status_code": 423, "detail": "Товар неактивен"},
+            {"product_id": 1000, "status_code": 404, "detail": "Товар не найден"},
+        ],
+    }
+
+    items = [{"product_id": 101, "quantity": 1, "action": "set"}]
+    response = await ac.post("/cart/batch", headers=headers, json=items)
+    assert response.json()["total_cost"] == 120
+
+    response = await ac.post("/cart/batch", headers=headers, json=[])
+    assert response.status_code == 422
+
+    await ac.delete("/cart", headers=headers)
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_get_cart_not_modified(user_token, admin_token, ac: AsyncClient):
+    """Повторное получение неизменившейся корзины по ETag"""
+    headers = {"Authorization": f"Bearer {user_token}"}
+
+    response = await ac.get("/cart", headers=headers)
+    etag = response.headers["ETag"]
+    response = await ac.get("/cart", headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["ETag"] == etag
+    assert response.content == b""
+
+    await ac.post("/cart", headers=headers, json={"product_id": 101})
+    response = await ac.get("/cart", headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    etag = response.headers["ETag"]
+
+    # Изменение цены товара в корзине меняет ее стоимость, а значит и версию
+    admin_headers = {"Authorization": f"Bearer {admin_token}"}
+    await ac.patch("/product/101", headers=admin_headers, json={"price": 35})
+    response = await ac.get("/cart", headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.json()["total_cost"] == 35
+    etag = response.headers["ETag"]
+
+    # Переименование товара не меняет стоимость, но меняет версию корзины
+    await ac.patch("/product/101", headers=admin_headers, json={"name": "renamed"})
+    response = await ac.get("/cart", headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.json()["cart"][0]["product"]["name"] == "renamed"
+
+    await ac.patch("/product/101", headers=admin_headers, json={"name": "test1", "price": 30})
+    await ac.delete("/cart", headers=headers)
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_cart_query_budget(user_token, ac: AsyncClient, query_budget, monkeypatch):
+    """Количество запросов к БД при работе с корзиной не зависит от числа товаров в ней"""
+    headers = {"Authorization": f"Bearer {user_token}"}
+    items = [{"product_id": product_id, "quantity": 1} for product_id in (101, 103, 104)]
+
+    with query_budget(8):
+        response = await ac.post("/cart/batch", headers=headers, json=items)
+    assert response.status_code == 200
+
+    with query_budget(2) as stats:
+        response = await ac.get("/cart", headers=headers)
+    assert response.status_code == 200
+    assert stats.repeated == 1
+
+    monkeypatch.setattr(settings, "debug", True)
+    response = await ac.get("/cart", headers={**headers, "If-None-Match": response.headers["ETag"]})
+    assert response.status_code == 304
+    assert response.headers["X-DB-Queries"] == "1"
+    assert float(response.headers["X-DB-Time-Ms"]) >= 0
+
+    await ac.delete("/cart", headers=headers)
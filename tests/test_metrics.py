@@ -0,0 +1,54 @@
+from httpx import AsyncClient
+import pytest
+from sqlalchemy import exc
+from sqlalchemy.ext.asyncio import create_async_engine
+from config.db import InstrumentedPool
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_read_metrics_by_admin(admin_token, ac: AsyncClient):
+    """Получение метрик процесса админом"""
+    headers = {"Authorization": f"Bearer {admin_token}"}
+
+    response = await ac.get("/metrics", headers=headers)
+    assert response.status_code == 200
+    hashing = response.json()["password_hashing"]
+    assert hashing["completed"] > 0
+    assert hashing["queued"] == 0
+    assert hashing["running"] == 0
+    assert response.json()["db_pool"]["checked_out"] == 0
+    cart_sql = response.json()["sql"]["GET /cart"]
+    assert cart_sql["requests"] > 0
+    assert cart_sql["statements"] >= cart_sql["requests"]
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_read_metrics_by_user(user_token, ac: AsyncClient):
+    """Попытка получения метрик неадмином"""
+    headers = {"Authorization": f"Bearer {user_token}"}
+    response = await ac.get("/metrics", headers=headers)
+    assert response.status_code == 403
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_db_pool_metrics():
+    """Учет выдачи соединений и таймаутов пула"""
+    engine = create_async_engine(
+        "sqlite+aiosqlite:///:memory:",
+        poolclass=InstrumentedPool,
+        pool_size=1,
+        max_overflow=0,
+        pool_timeout=0.1,
+    )
+    async with engine.connect():
+        assert engine.pool.stats()["checked_out"] == 1
+        with pytest.raises(exc.TimeoutError):
+            async with engine.connect():
+                pass
+
+    stats = engine.pool.stats()
+    assert stats["checkouts"] == 1
+    assert stats["timeouts"] == 1
+    assert stats["checked_out"] == 0
+    assert stats["wait_seconds"] >= 0.1
+    await engine.dispose()
@@ -1,6 +1,25 @@
 import asyncio
+import json
+from collections import namedtuple
+import jwt
+from datetime import datetime, timedelta, timezone
 from httpx import AsyncClient
 import pytest
+from starlette.requests import Request
+from config import db as db_config
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from config.settings import settings
+from services.cache import MISSING
+from services.events import CHANNEL, MAX_PAYLOAD_BYTES, WORKER_ID, event_payload, on_notification
+from conftest import async_test_session_maker
+from models.product import Product
+from models.product_deletion import ProductDeletion
+from services import product as product_service
+from services.suggest import SuggestIndex
+from services.product import deletion_tasks, product_cache, resume_product_deletions
+
+Row = namedtuple("Row", "id name is_active")
 
 
 @pytest.mark.asyncio(loop_scope="session")
@@ -197,3 +216,514 @@ async def test_list_product_by_user(user_token, ac: AsyncClient):
     response = await ac.get("/product", headers=headers)
     assert response.status_code == 200
     assert len(response.json()) == 7
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_list_product_pagination(admin_token, ac: AsyncClient):
+    """Постраничное получение списка товаров по курсору"""
+    headers = {"Authorization": f"Bearer {admin_token}"}
+
+    response = await ac.get("/product", headers=headers, params={"limit": 4})
+    assert response.status_code == 200
+    ids = [item["id"] for item in response.json()]
+    assert len(ids) == 4
+
+    while "X-Next-Cursor" in response.headers:
+        params = {"limit": 4, "cursor": response.headers["X-Next-Cursor"]}
+        response = await ac.get("/product", headers=headers, params=params)
+        assert response.status_code == 200
+        ids.extend(item["id"] for item in response.json())
+
+    assert len(ids) == 9
+    assert ids == sorted(ids, reverse=True)
+
+    response = await ac.get("/product", headers=headers, params={"limit": 4, "after_id": ids[3]})
+    assert [item["id"] for item in response.json()] == ids[4:8]
+
+    response = await ac.get("/product", headers=headers, params={"cursor": "broken"})
+    assert response.status_code == 400
+    assert response.json() == {"detail": "Некорректный курсор"}
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_list_product_sort_filter(admin_token, ac: AsyncClient):
+    """Сортировка и фильтрация списка товаров с постраничным выводом"""
+    headers = {"Authorization": f"Bearer {admin_token}"}
+
+    response = await ac.get("/product", headers=headers)
+    products = response.json()
+
+    for sort in ("name", "price"):
+        items = []
+        params = {"limit": 2, "sort": sort}
+        while True:
+            response = await ac.get("/product", headers=headers, params=params)
+            assert response.status_code == 200
+            items.extend(response.json())
+            if "X-Next-Cursor" not in response.headers:
+                break
+            params = {"limit": 2, "sort": sort, "cursor": response.headers["X-Next-Cursor"]}
+        assert items == sorted(products, key=lambda item: (item[sort], item["id"]))
+
+    prices = sorted(item["price"] for item in products)
+    params = {"min_price": prices[2], "max_price": prices[-3]}
+    response = await ac.get("/product", headers=headers, params=params)
+    assert response.status_code == 200
+    assert all(prices[2] <= item["price"] <= prices[-3] for item in response.json())
+    assert len(response.json()) == len([price for price in prices if prices[2] <= price <= prices[-3]])
+
+    response = await ac.get("/product", headers=headers, params={"updated_since": "2100-01-01T00:00:00"})
+    assert response.status_code == 200
+    assert response.json() == []
+
+    response = await ac.get("/product", headers=headers, params={"sort": "unknown"})
+    assert response.status_code == 422
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_read_product_cache(admin_token, user_token, ac: AsyncClient):
+    """Повторное чтение товара обслуживается из кеша и видит изменения товара"""
+    headers = {"Authorization": f"Bearer {user_token}"}
+    admin_headers = {"Authorization": f"Bearer {admin_token}"}
+
+    await ac.get("/product/101", headers=headers)
+    stats = (await ac.get("/metrics", headers=admin_headers)).json()["product_cache"]
+    response = await ac.get("/product/101", headers=headers)
+    assert response.status_code == 200
+    assert (await ac.get("/metrics", headers=admin_headers)).json()["product_cache"]["hits"] == stats["hits"] + 1
+
+    await ac.patch("/product/101", headers=admin_headers, json={"price": 31})
+    response = await ac.get("/product/101", headers=headers)
+    assert response.json()["price"] == 31
+    await ac.patch("/product/101", headers=admin_headers, json={"price": 30})
+
+    # Закешированный неактивный товар доступен админу и недоступен пользователю
+    response = await ac.get("/product/102", headers=headers)
+    assert response.status_code == 423
+    response = await ac.get("/product/102", headers=admin_headers)
+    assert response.status_code == 200
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_list_product_cache(admin_token, ac: AsyncClient):
+    """Повторный запрос списка товаров отдается из кеша, в том числе в сжатом виде"""
+    headers = {"Authorization": f"Bearer {admin_token}"}
+
+    first = await ac.get("/product", headers={**headers, "Accept-Encoding": "identity"})
+    stats = (await ac.get("/metrics", headers=headers)).json()["catalog_cache"]
+    second = await ac.get("/product", headers={**headers, "Accept-Encoding": "gzip"})
+    assert second.headers["Content-Encoding"] == "gzip"
+    assert second.json() == first.json()
+    assert (await ac.get("/metrics", headers=headers)).json()["catalog_cache"]["hits"] == stats["hits"] + 1
+
+    # Изменение товара сбрасывает кеш списка
+    await ac.patch("/product/101", headers=headers, json={"name": "renamed"})
+    response = await ac.get("/product", headers=headers)
+    assert "renamed" in [item["name"] for item in response.json()]
+    await ac.patch("/product/101", headers=headers, json={"name": "test1"})
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_product_list_sort_indexes():
+    """Сортировки списка товаров администратора и пользователя выполняются по индексу, без сортировки в памяти"""
+    async with async_test_session_maker() as db:
+        for sort in ("name", "price"):
+            for where in ("", "WHERE is_active "):
+                response = await db.execute(
+                    text(f"EXPLAIN QUERY PLAN SELECT * FROM products {where}ORDER BY {sort}, id LIMIT 21")
+                )
+                plan = " ".join(row[-1] for row in response)
+                assert "USING INDEX" in plan and "TEMP B-TREE" not in plan, plan
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_product_event_from_other_worker(user_token, ac: AsyncClient):
+    """Событие об изменении товара от другого воркера сбрасывает кеш товара"""
+    headers = {"Authorization": f"Bearer {user_token}"}
+
+    await ac.get("/product/101", headers=headers)
+    assert product_cache.get(101) is not MISSING
+
+    on_notification(None, 0, CHANNEL, json.dumps({"entity": "product", "origin": WORKER_ID, "id": 101}))
+    assert product_cache.get(101) is not MISSING
+
+    on_notification(None, 0, CHANNEL, json.dumps({"entity": "product", "origin": "other", "id": 101}))
+    assert product_cache.get(101) is MISSING
+
+
+def test_product_event_payload_size():
+    """Событие с длинным наименованием товара заменяется событием без id, которое примет pg_notify"""
+    assert json.loads(event_payload("product", id=101, name="товар", is_active=True))["name"] == "товар"
+
+    payload = event_payload("product", id=101, name="т" * 5000, is_active=True)
+    assert len(payload.encode()) < MAX_PAYLOAD_BYTES
+    assert json.loads(payload) == {"entity": "product", "origin": WORKER_ID}
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_search_product(admin_token, user_token, ac: AsyncClient):
+    """Поиск товаров по наименованию с постраничным выводом"""
+    headers = {"Authorization": f"Bearer {user_token}"}
+
+    response = await ac.get("/product/search", headers=headers, params={"q": "TEST", "limit": 3})
+    assert response.status_code == 200
+    ids = [item["id"] for item in response.json()]
+    assert len(ids) == 3
+    response = await ac.get(
+        "/product/search",
+        headers=headers,
+        params={"q": "TEST", "limit": 3, "cursor": response.headers["X-Next-Cursor"]},
+    )
+    ids.extend(item["id"] for item in response.json())
+    assert "X-Next-Cursor" not in response.headers
+    # Активные товары test1, test2, test3, test4, test5 и test1 из начальных данных
+    assert len(ids) == 6
+    assert ids == sorted(ids, reverse=True)
+
+    response = await ac.get("/product/search", headers=headers, params={"q": "no_act"})
+    assert response.json() == []
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    response = await ac.get("/product/search", headers=headers, params={"q": "no_act"})
+    assert [item["name"] for item in response.json()] == ["no_act"]
+
+    response = await ac.get("/product/search", headers=headers, params={"q": "%"})
+    assert response.json() == []
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_suggest_product(admin_token, user_token, ac: AsyncClient):
+    """Подсказки по началу наименования обновляются при изменении товаров"""
+    headers = {"Authorization": f"Bearer {user_token}"}
+    admin_headers = {"Authorization": f"Bearer {admin_token}"}
+
+    response = await ac.get("/product/suggest", headers=headers, params={"prefix": "AC"})
+    assert response.status_code == 200
+    assert [item["name"] for item in response.json()] == ["act"]
+
+    response = await ac.post("/product", headers=admin_headers, json={"name": "Acorn", "price": 5})
+    acorn_id = response.json()["id"]
+    response = await ac.get("/product/suggest", headers=headers, params={"prefix": "ac"})
+    assert response.json() == [{"id": acorn_id, "name": "Acorn"}, {"id": response.json()[1]["id"], "name": "act"}]
+
+    await ac.patch(f"/product/{acorn_id}", headers=admin_headers, json={"is_active": False})
+    response = await ac.get("/product/suggest", headers=headers, params={"prefix": "ac"})
+    assert [item["name"] for item in response.json()] == ["act"]
+
+    await ac.delete(f"/product/{acorn_id}", headers=admin_headers)
+    response = await ac.get("/product/suggest", headers=headers, params={"prefix": "test", "limit": 2})
+    assert [item["name"] for item in response.json()] == ["test1", "test1"]
+
+
+def test_suggest_update_many():
+    """Пакетное изменение товаров в индексе подсказок с одной пересортировкой"""
+    index = SuggestIndex(max_entries=3, max_key_length=10)
+    index.update(1, "beta", True)
+    index.update(2, "alpha", True)
+
+    index.update_many([Row(1, "delta", True), Row(2, "alpha", False), Row(3, "gamma", True), Row(4, "omega", True)])
+    assert index.keys == [("delta", 1), ("gamma", 3), ("omega", 4)]
+    assert index.suggest("a", 10) == []
+    assert index.dropped == 0
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_import_product(admin_token, user_token, ac: AsyncClient):
+    """Импорт товаров из CSV и NDJSON с обновлением существующих и пропуском некорректных строк"""
+    headers = {"Authorization": f"Bearer {admin_token}"}
+
+    content = 'id,name,price,is_active\n501,"Import, 1",10,true\n502,import2,x,\n,import3,30,false\n501,import1,15,\n'
+    response = await ac.post("/product/import", headers={**headers, "Content-Type": "text/csv"}, content=content)
+    assert response.status_code == 200
+    assert response.json()["imported"] == 2
+    assert response.json()["rejected"] == 1
+    assert response.json()["errors"][0]["line"] == 3
+
+    response = await ac.get("/product/501", headers=headers)
+    assert response.json()["name"] == "import1"
+    assert response.json()["price"] == 15
+    assert response.json()["is_active"] is True
+
+    # Строка без is_active не меняет активность существующего товара
+    await ac.patch("/product/501", headers=headers, json={"is_active": False})
+    content = '{"id": 501, "name": "import1", "price": 20}\n[]\n{"name": "import4", "price": 40}\n'
+    response = await ac.post("/product/import", headers=headers, content=content)
+    assert response.status_code == 200
+    assert response.json() == {
+        "imported": 2,
+        "rejected": 1,
+        "errors": [{"line": 2, "detail": "Ожидается JSON объект"}],
+    }
+
+    response = await ac.get("/product/501", headers=headers)
+    assert response.json()["price"] == 20
+    assert response.json()["is_active"] is False
+    response = await ac.get("/product/search", headers=headers, params={"q": "import"})
+    assert sorted(item["name"] for item in response.json()) == ["import1", "import3", "import4"]
+
+    response = await ac.post("/product/import", headers={"Authorization": f"Bearer {user_token}"}, content="")
+    assert response.status_code == 403
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_export_product(admin_token, user_token, ac: AsyncClient, monkeypatch):
+    """Потоковая выгрузка всех товаров в NDJSON, в том числе сжатая"""
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    monkeypatch.setattr(settings.batch, "product_export_chunk_size", 4)
+
+    response = await ac.get("/product", headers=headers, params={"limit": 500})
+    products = sorted(response.json(), key=lambda item: item["id"])
+
+    response = await ac.get("/product/export", headers={**headers, "Accept-Encoding": "identity"})
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    assert "content-encoding" not in response.headers
+    assert [json.loads(line) for line in response.text.splitlines()] == products
+
+    response_gzip = await ac.get("/product/export", headers={**headers, "Accept-Encoding": "gzip"})
+    assert response_gzip.headers["content-encoding"] == "gzip"
+    assert response_gzip.text == response.text
+
+    response = await ac.get("/product/export", headers={"Authorization": f"Bearer {user_token}"})
+    assert response.status_code == 403
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_product_changes(admin_token, user_token, ac: AsyncClient, monkeypatch):
+    """Лента изменений товаров с продолжением по курсору и отметками об удалении"""
+    headers = {"Authorization": f"Bearer {admin_token}"}
+
+    changes = []
+    params = {"limit": 4}
+    while True:
+        response = await ac.get("/product/changes", headers=headers, params=params)
+        assert response.status_code == 200
+        changes.extend(response.json()["changes"])
+        params["since"] = response.json()["cursor"]
+        if not response.json()["has_more"]:
+            break
+
+    response = await ac.get("/product", headers=headers, params={"limit": 500})
+    assert sorted(item["product"]["id"] for item in changes if not item["deleted"]) == sorted(
+        item["id"] for item in response.json()
+    )
+    assert {103, 104}.issubset(item["id"] for item in changes if item["deleted"])
+
+    await ac.patch("/product/105", headers=headers, json={"price": 55})
+    await ac.delete("/product/106", headers=headers)
+
+    response = await ac.get("/product/changes", headers=headers, params=params)
+    assert [(item["id"], item["deleted"]) for item in response.json()["changes"]] == [(105, False), (106, True)]
+    assert response.json()["changes"][0]["product"]["price"] == 55
+    assert response.json()["changes"][1]["product"] is None
+
+    params["since"] = response.json()["cursor"]
+    response = await ac.get("/product/changes", headers=headers, params=params)
+    assert response.json() == {"changes": [], "cursor": params["since"], "has_more": False}
+
+    response = await ac.get("/product/changes", headers=headers, params={"since": "broken"})
+    assert response.status_code == 400
+    response = await ac.get("/product/changes", headers={"Authorization": f"Bearer {user_token}"})
+    assert response.status_code == 403
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_product_changes_open_transaction(admin_token, ac: AsyncClient, monkeypatch):
+    """Изменения транзакции, зафиксированной после более поздних транзакций, не пропускаются лентой"""
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    params = {"limit": 500}
+    response = await ac.get("/product/changes", headers=headers, params=params)
+    assert response.json()["has_more"] is False
+    params["since"] = response.json()["cursor"]
+
+    # Длинная транзакция изменила товар 101, после нее товар 105 изменила и зафиксировала другая транзакция.
+    # Пока длинная транзакция не зафиксирована, граница ленты не выше ее номера изменения
+    # (SQLite выполняет пишущие транзакции по одной, поэтому незавершенная транзакция имитируется границей).
+    await ac.patch("/product/101", headers=headers, json={"price": 31})
+    await ac.patch("/product/105", headers=headers, json={"price": 56})
+    open_transaction = select(Product.change_seq).where(Product.id == 101).scalar_subquery()
+    monkeypatch.setattr(product_service, "change_watermark", lambda: open_transaction)
+
+    response = await ac.get("/product/changes", headers=headers, params=params)
+    assert response.json() == {"changes": [], "cursor": params["since"], "has_more": False}
+
+    # Длинная транзакция зафиксирована: курсор не ушел дальше ее изменений
+    monkeypatch.undo()
+    response = await ac.get("/product/changes", headers=headers, params=params)
+    assert [item["id"] for item in response.json()["changes"]] == [101, 105]
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_read_products_batch(admin_token, user_token, ac: AsyncClient):
+    """Получение нескольких товаров одним запросом с ошибками для недоступных товаров"""
+    headers = {"Authorization": f"Bearer {user_token}"}
+
+    response = await ac.post("/product/batch", headers=headers, json=[101, 102, 1, 101])
+    assert response.status_code == 200
+    statuses = [(item["id"], item["status_code"]) for item in response.json()]
+    assert statuses == [(101, 200), (102, 423), (1, 404), (101, 200)]
+    assert response.json()[0]["product"]["name"] == "test1"
+    assert response.json()[1] == {"id": 102, "status_code": 423, "detail": "Товар неактивен", "product": None}
+    assert response.json()[2]["detail"] == "Товар не найден"
+
+    response = await ac.post("/product/batch", headers={"Authorization": f"Bearer {admin_token}"}, json=[102])
+    assert response.json()[0]["status_code"] == 200
+    assert response.json()[0]["product"]["is_active"] is False
+
+    response = await ac.post("/product/batch", headers=headers, json=[])
+    assert response.status_code == 422
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_bulk_update_product(admin_token, user_token, ac: AsyncClient):
+    """Обновление нескольких товаров одним запросом"""
+    headers = {"Authorization": f"Bearer {admin_token}"}
+
+    data = {"ids": [101, 105, 1], "patch": {"price": 77}}
+    response = await ac.patch("/product/bulk", headers=headers, json=data)
+    assert response.status_code == 200
+    assert response.json() == {"updated": [101, 105], "not_found": [1]}
+
+    data = {"items": [{"id": 101, "name": "bulk1"}, {"id": 102, "is_active": True}, {"id": 101, "price": 11}]}
+    response = await ac.patch("/product/bulk", headers=headers, json=data)
+    assert response.json() == {"updated": [101, 102], "not_found": []}
+
+    response = await ac.post("/product/batch", headers={"Authorization": f"Bearer {user_token}"}, json=[101, 102, 105])
+    products = [item["product"] for item in response.json()]
+    assert [(item["name"], item["price"], item["is_active"]) for item in products] == [
+        ("bulk1", 11, True),
+        ("test2", 25, True),
+        (products[2]["name"], 77, True),
+    ]
+
+    # Максимальный размер запроса
+    data = {"items": [{"id": 105, "price": 78}] + [{"id": 200000 + n, "price": 1} for n in range(9999)]}
+    response = await ac.patch("/product/bulk", headers=headers, json=data)
+    assert response.status_code == 200
+    assert response.json()["updated"] == [105]
+    assert len(response.json()["not_found"]) == 9999
+    data["items"].append({"id": 101, "price": 1})
+    response = await ac.patch("/product/bulk", headers=headers, json=data)
+    assert response.status_code == 422
+
+    for data in ({"ids": [101]}, {"ids": [101], "patch": {}, "items": [{"id": 101}]}, {"ids": [101], "patch": {}}):
+        response = await ac.patch("/product/bulk", headers=headers, json=data)
+        assert response.status_code == 422
+
+    response = await ac.patch("/product/bulk", headers={"Authorization": f"Bearer {user_token}"}, json=data)
+    assert response.status_code == 403
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_delete_product_in_carts(admin_token, user_token, ac: AsyncClient, monkeypatch):
+    """Удаление товара из корзин частями в фоне с отчетом о ходе удаления"""
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    user_headers = {"Authorization": f"Bearer {user_token}"}
+    monkeypatch.setattr(settings.batch, "product_delete_batch_size", 1)
+
+    response = await ac.post("/product", headers=headers, json={"name": "in_carts", "price": 5})
+    product_id = response.json()["id"]
+    for item_headers in (headers, user_headers):
+        response = await ac.post("/cart", headers=item_headers, json={"product_id": product_id, "quantity": 2})
+        assert response.status_code == 201
+
+    response = await ac.delete(f"/product/{product_id}", headers=headers)
+    assert response.status_code == 200
+    assert response.json() == {"message": "Товар успешно удалён"}
+
+    response = await ac.get(f"/product/{product_id}/deletion", headers=headers)
+    assert response.status_code == 200
+    assert response.json()["status"] == "done"
+    assert response.json()["deleted_cart_items"] == 2
+
+    response = await ac.get(f"/product/{product_id}", headers=headers)
+    assert response.status_code == 404
+    response = await ac.get("/cart", headers=user_headers)
+    assert product_id not in [item["product"]["id"] for item in response.json()["cart"]]
+
+    response = await ac.get("/product/1/deletion", headers=headers)
+    assert response.status_code == 404
+    response = await ac.get(f"/product/{product_id}/deletion", headers=user_headers)
+    assert response.status_code == 403
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_resume_product_deletion(admin_token, ac: AsyncClient):
+    """Удаление товара, брошенное остановленным воркером, продолжается другим воркером"""
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    response = await ac.post("/product", headers=headers, json={"name": "abandoned", "price": 5})
+    product_id = response.json()["id"]
+    await ac.post("/cart", headers=headers, json={"product_id": product_id})
+
+    # Воркер запустил удаление, удалил часть строк корзин и был остановлен
+    updated_at = datetime.now(timezone.utc) - timedelta(seconds=settings.batch.product_delete_stale_seconds + 1)
+    async with async_test_session_maker() as db:
+        await db.merge(
+            ProductDeletion(
+                product_id=product_id,
+                status="running",
+                deleted_cart_items=3,
+                started_at=updated_at,
+                updated_at=updated_at,
+                finished_at=None,
+            )
+        )
+        await db.commit()
+    response = await ac.get(f"/product/{product_id}/deletion", headers=headers)
+    assert response.json()["status"] == "running"
+
+    assert await resume_product_deletions(async_test_session_maker) == [product_id]
+    assert await resume_product_deletions(async_test_session_maker) == []
+    await asyncio.gather(*deletion_tasks)
+
+    response = await ac.get(f"/product/{product_id}/deletion", headers=headers)
+    assert response.json()["status"] == "done"
+    assert response.json()["deleted_cart_items"] == 4
+    response = await ac.get(f"/product/{product_id}", headers=headers)
+    assert response.status_code == 404
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_read_your_writes_pinning(admin_token, user_token, ac: AsyncClient, monkeypatch):
+    """После изменения данных клиент читает из основной БД, а не из реплики"""
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    monkeypatch.setattr(db_config, "replica_session_maker", db_config.async_session_maker)
+
+    # Чтение, в том числе запросом POST, не закрепляет клиента за основной БД
+    response = await ac.get("/product/101", headers=headers)
+    assert db_config.PRIMARY_COOKIE not in response.cookies
+    response = await ac.post("/product/batch", headers=headers, json=[101])
+    assert db_config.PRIMARY_COOKIE not in response.cookies
+    response = await ac.post("/users/login", json={"username": "admin@admin.ru", "password": "Qwerty12345!"})
+    assert response.status_code == 200
+    assert db_config.PRIMARY_COOKIE not in response.cookies
+    assert len(db_config.pinned_clients.items) == 0
+
+    response = await ac.patch("/product/bulk", headers=headers, json={"ids": [1], "patch": {"price": 1}})
+    assert db_config.PRIMARY_COOKIE in response.cookies
+    ac.cookies.clear()
+
+    def request(token: str) -> Request:
+        return Request({"type": "http", "headers": [(b"authorization", f"Bearer {token}".encode())]})
+
+    # Клиент запоминается по id пользователя, а не по токену
+    admin_id = jwt.decode(admin_token, options={"verify_signature": False})["uid"]
+    assert list(db_config.pinned_clients.items) == [admin_id]
+    assert db_config.is_pinned_to_primary(request(admin_token))
+    assert not db_config.is_pinned_to_primary(request(user_token))
+    db_config.pinned_clients.clear()
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_request_sessions():
+    """Сессии запроса создаются при первом обращении и общие для чтения и записи"""
+    request = Request({"type": "http", "headers": []})
+    session_maker = async_sessionmaker()
+
+    async with db_config.RequestSessions(request, session_maker) as sessions:
+        assert sessions.primary is None
+        assert sessions.get_read() is sessions.get_primary()
+
+    async with db_config.RequestSessions(request, session_maker, session_maker) as sessions:
+        read_db = sessions.get_read()
+        assert read_db is not sessions.get_primary()
+        assert sessions.get_read() is sessions.primary